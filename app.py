@@ -4,35 +4,64 @@
 
 import json
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
+import babel.dates
+from flask import Flask, Blueprint, current_app, render_template, request, Response, flash, redirect, url_for, abort, session, stream_with_context, make_response, jsonify
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.associationproxy import association_proxy
+from forms import ArtistForm, ShowForm, VenueForm
 from flask_migrate import Migrate
+from pagination import encode_cursor, estimate_count, keyset_page, page_size
+from cache import PageCache
+from dbpool import InstrumentedQueuePool
+from routing import RoutingSQLAlchemy, read_only
+from sqlstats import SQLStats
+from logqueue import LogPipeline
+from archive import archive_shows
+from assets import Assets, build_assets
+from typeahead import Typeahead
+import search
+from importer import (
+    ImportSpec, check_references, insert_chunk, run_import, validate_row)
+import click
 import datetime
+import functools
+import hashlib
+import hmac
+import heapq
+import itertools
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object("config")
-db = SQLAlchemy(app)
+# Extensions and blueprints are created unbound here and attached to an app
+# by create_app() at the bottom of this file.
+
+db = RoutingSQLAlchemy()
+migrate = Migrate()
+sql_stats = SQLStats()
+log_pipeline = LogPipeline()
+page_cache = PageCache()
+assets = Assets()
+typeahead = Typeahead()
+pages = Blueprint("pages", __name__, cli_group=None)
 
-# Done: connect to a local postgresql database
-migrate = Migrate(app, db)
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
 
+def utcnow():
+    return datetime.datetime.utcnow()
+
+
 class Venue(db.Model):
     __tablename__ = "Venue"
+    # Serves the area listing's (state, city, id) order and the /shows city
+    # and state filters.
+    __table_args__ = (
+        db.Index("ix_Venue_state_city", "state", "city"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -48,14 +77,21 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     looking_for_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(250))
-    genres = db.Column(db.String(120))
+    # Bumped on every write by touch_updated_at; drives Last-Modified/ETag.
+    updated_at = db.Column(db.DateTime, default=utcnow, index=True)
+    genre_links = db.relationship(
+        'VenueGenre', cascade='all, delete-orphan', lazy=True)
+    genres = association_proxy(
+        'genre_links', 'genre', creator=lambda genre: VenueGenre(genre=genre))
     shows = db.relationship('Show', backref='venue', lazy=True)
+    archived_shows = db.relationship(
+        'ShowArchive', backref='venue', lazy=True)
 
     def format(self):
         return {
             "id": self.id,
             "name": self.name,
-            "genres": self.genres.split(','),
+            "genres": list(self.genres),
             "address": self.address,
             "city": self.city,
             "state": self.state,
@@ -67,17 +103,72 @@ class Venue(db.Model):
             "image_link": self.image_link
         }
 
-    def find_num_upcoming_shows(self):
-        numShows = Show.query.filter(
-            Show.venue_id == self.id,
-            Show.datetime > datetime.datetime.now()).count()
-        return numShows
-
-    def find_num_past_shows(self):
-        numShows = Show.query.filter(
-            Show.venue_id == self.id,
-            Show.datetime < datetime.datetime.now()).count()
-        return numShows
+    @classmethod
+    def find_show_counts(cls, ids):
+        # {venue_id: (num_upcoming_shows, num_past_shows)} for every id in
+        # one grouped query, see count_shows_by.
+        return count_shows_by(Show.venue_id, ids)
+
+    @classmethod
+    def find_details(cls, venue_id):
+        # Everything the venue page shows: the venue, its shows and each
+        # show's artist in one statement, then its genres, and its archived
+        # shows with their artists, in one more each. Returns None for an
+        # unknown id.
+        venue = cls.query.options(
+            db.joinedload(cls.shows).joinedload(Show.artist),
+            db.selectinload(cls.genre_links),
+            db.selectinload(cls.archived_shows).joinedload(ShowArchive.artist)
+        ).filter(cls.id == venue_id).one_or_none()
+        if venue is None:
+            return None
+        data = venue.format()
+        shows = venue.shows + venue.archived_shows
+        data.update(split_shows(shows, lambda show: {
+            "artist_id": show.artist.id,
+            "artist_name": show.artist.name,
+            "artist_image_link": show.artist.image_link,
+            "start_time": show.datetime}))
+        return data
+
+    @classmethod
+    def find_areas(cls, cursor=None, per_page=None, genre=None):
+        # Builds the areas -> venues -> num_upcoming_shows listing from a
+        # single LEFT JOIN / GROUP BY instead of one query per area and
+        # one count per venue. Returns (areas, next_cursor); the page is
+        # keyed on (state, city, id) so an area can continue on the next
+        # page. A missing city or state sorts and pages as "".
+        city = db.func.coalesce(cls.city, "").label("city")
+        state = db.func.coalesce(cls.state, "").label("state")
+        num_upcoming_shows = db.func.count(Show.id).label(
+            "num_upcoming_shows")
+        query = db.session.query(
+            cls.id, cls.name, city, state, num_upcoming_shows
+        ).outerjoin(
+            Show, db.and_(
+                Show.venue_id == cls.id,
+                Show.datetime > datetime.datetime.now())
+        ).group_by(
+            cls.id, cls.name, cls.city, cls.state)
+        if genre:
+            query = query.filter(cls.id.in_(
+                db.session.query(VenueGenre.venue_id).filter(
+                    VenueGenre.genre == genre)))
+        rows, next_cursor = keyset_page(
+            query, [state, city, cls.id], cursor, per_page)
+        areas = []
+        for (city, state), venues in itertools.groupby(
+                rows, key=lambda row: (row.city, row.state)):
+            areas.append({
+                "city": city,
+                "state": state,
+                "venues": [{
+                    "id": venue.id,
+                    "name": venue.name,
+                    "num_upcoming_shows": venue.num_upcoming_shows}
+                    for venue in venues]
+            })
+        return areas, next_cursor
 
 
 class Artist(db.Model):
@@ -88,7 +179,6 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -97,46 +187,73 @@ class Artist(db.Model):
     website_link = db.Column(db.String(500))
     looking_for_venue = db.Column(db.Boolean())
     seeking_description = db.Column(db.String(120))
+    # Bumped on every write by touch_updated_at; drives Last-Modified/ETag.
+    updated_at = db.Column(db.DateTime, default=utcnow, index=True)
     shows = db.relationship('Show', backref='artist', lazy=True)
-
-    def find_num_upcoming_shows(self):
-        numShows = Show.query.filter(
-            Show.artist_id == self.id,
-            Show.datetime > datetime.datetime.now()).count()
-        return numShows
-
-    def find_num_past_shows(self):
-        numShows = Show.query.filter(
-            Show.artist_id == self.id,
-            Show.datetime < datetime.datetime.now()).count()
-        return numShows
+    archived_shows = db.relationship(
+        'ShowArchive', backref='artist', lazy=True)
+    genre_links = db.relationship(
+        'ArtistGenre', cascade='all, delete-orphan', lazy=True)
+    genres = association_proxy(
+        'genre_links', 'genre', creator=lambda genre: ArtistGenre(genre=genre))
+
+    @classmethod
+    def find_show_counts(cls, ids):
+        # {artist_id: (num_upcoming_shows, num_past_shows)} for every id in
+        # one grouped query, see count_shows_by.
+        return count_shows_by(Show.artist_id, ids)
+
+    @classmethod
+    def find_details(cls, artist_id):
+        # Everything the artist page shows: the artist, its shows and each
+        # show's venue in one statement, then its genres, and its archived
+        # shows with their venues, in one more each. Returns None for an
+        # unknown id.
+        artist = cls.query.options(
+            db.joinedload(cls.shows).joinedload(Show.venue),
+            db.selectinload(cls.genre_links),
+            db.selectinload(cls.archived_shows).joinedload(ShowArchive.venue)
+        ).filter(cls.id == artist_id).one_or_none()
+        if artist is None:
+            return None
+        data = artist.format()
+        shows = artist.shows + artist.archived_shows
+        data.update(split_shows(shows, lambda show: {
+            "venue_id": show.venue.id,
+            "venue_name": show.venue.name,
+            "venue_image_link": show.venue.image_link,
+            "start_time": show.datetime}))
+        return data
 
     def format(self):
         return {
             "id": self.id,
-            "genres": self.genres.split(','),
+            "name": self.name,
+            "genres": list(self.genres),
             "city": self.city,
             "state": self.state,
             "phone": self.phone,
             "seeking_venue": self.looking_for_venue,
             "image_link": self.image_link,
             "facebook_link": self.facebook_link,
+            "website": self.website_link,
             "website_link": self.website_link,
+            "seeking_description": self.seeking_description,
         }
 
-    def find_upcoming_shows(self):
-        return Show.query.filter(
-            self.id == Show.artist_id,
-            Show.datetime > datetime.datetime.now()).all()
-
-    def find_past_shows(self):
-        return Show.query.filter(
-            self.id == Show.artist_id,
-            Show.datetime < datetime.datetime.now()).all()
-
 
 class Show(db.Model):
     __tablename__ = "Show"
+    # Every hot lookup filters on one side of the relationship plus a
+    # datetime range; the other foreign key is included so those lookups
+    # can be answered from the index alone on Postgres.
+    __table_args__ = (
+        db.Index("ix_Show_venue_id_datetime", "venue_id", "datetime",
+                 postgresql_include=["artist_id"]),
+        db.Index("ix_Show_artist_id_datetime", "artist_id", "datetime",
+                 postgresql_include=["venue_id"]),
+        db.Index("ix_Show_datetime", "datetime"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     datetime = db.Column(db.DateTime)
@@ -145,33 +262,394 @@ class Show(db.Model):
         db.Integer,
         db.ForeignKey('Artist.id'),
         nullable=False)
+    # Bumped on every write by touch_updated_at; drives Last-Modified/ETag.
+    updated_at = db.Column(db.DateTime, default=utcnow, index=True)
+
+
+class ShowArchive(db.Model):
+    __tablename__ = "ShowArchive"
+    # Shows moved out of Show by `flask archive-shows` (see archive.py),
+    # with their ids and timestamps kept. Indexed like Show, since the
+    # same per-venue, per-artist and date-range lookups read both tables.
+    __table_args__ = (
+        db.Index("ix_ShowArchive_venue_id_datetime", "venue_id", "datetime",
+                 postgresql_include=["artist_id"]),
+        db.Index("ix_ShowArchive_artist_id_datetime", "artist_id",
+                 "datetime", postgresql_include=["venue_id"]),
+        db.Index("ix_ShowArchive_datetime", "datetime"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    datetime = db.Column(db.DateTime)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(
+        db.Integer,
+        db.ForeignKey('Artist.id'),
+        nullable=False)
+    updated_at = db.Column(db.DateTime)
+
+
+# Genres live in one row per (venue or artist, genre). The primary key
+# leads with the owner so its genres load together; the genre index serves
+# the ?genre= filters.
+
+
+class VenueGenre(db.Model):
+    __tablename__ = "VenueGenre"
+    __table_args__ = (
+        db.Index("ix_VenueGenre_genre_venue_id", "genre", "venue_id"),
+    )
+
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+        primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = "ArtistGenre"
+    __table_args__ = (
+        db.Index("ix_ArtistGenre_genre_artist_id", "genre", "artist_id"),
+    )
+
+    artist_id = db.Column(
+        db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+        primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+
+
+@db.event.listens_for(db.session, "before_flush")
+def touch_updated_at(session, flush_context, instances):
+    # Covers changes that don't touch the row's own columns, such as a
+    # venue whose only edit is to its genres.
+    now = utcnow()
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist, Show)) and session.is_modified(obj):
+            obj.updated_at = now
+
+
+def count_shows_by(column, ids):
+    # Counts upcoming and past shows for many venues or artists at once,
+    # archived shows included. `column` is Show.venue_id or Show.artist_id;
+    # ids without any show map to (0, 0).
+    ids = list(ids)
+    counts = dict.fromkeys(ids, (0, 0))
+    if not ids:
+        return counts
+    now = datetime.datetime.now()
+    # Each side of the UNION ALL is filtered on its own (fk, datetime) index.
+    shows = db.union_all(*[
+        db.select(model.__table__.c[column.key].label("owner_id"),
+                  model.datetime).where(model.__table__.c[column.key].in_(ids))
+        for model in (Show, ShowArchive)]).subquery()
+    rows = db.session.query(
+        shows.c.owner_id,
+        db.func.sum(db.case((shows.c.datetime > now, 1), else_=0)),
+        db.func.sum(db.case((shows.c.datetime < now, 1), else_=0)),
+    ).group_by(shows.c.owner_id).all()
+    for id, upcoming, past in rows:
+        counts[id] = (int(upcoming), int(past))
+    return counts
+
+
+def billed_with(key, owner_key, owner_id):
+    # Ids in column `key` ("venue_id" or "artist_id") of every current or
+    # archived show whose `owner_key` is `owner_id`, as a SELECT usable in
+    # IN (...).
+    return db.union(*[
+        db.select(model.__table__.c[key]).where(
+            model.__table__.c[owner_key] == owner_id)
+        for model in (Show, ShowArchive)])
+
+
+def split_shows(shows, format_show):
+    # Partitions already loaded shows into past and upcoming in one pass
+    # against a single timestamp, so a show can't land in both lists or in
+    # neither, and the counts come for free.
+    now = datetime.datetime.now()
+    past_shows, upcoming_shows = [], []
+    shows = [show for show in shows if show.datetime is not None]
+    for show in sorted(shows, key=lambda show: show.datetime):
+        if show.datetime > now:
+            upcoming_shows.append(format_show(show))
+        else:
+            past_shows.append(format_show(show))
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
 
 
 # TODO Implement Show and Artist models, and complete all model
 # relationships and properties, as a database migration.
 
+search.install(Venue)
+search.install(Artist)
+typeahead.register("venues", Venue)
+typeahead.register("artists", Artist)
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
+# The same show times are rendered over and over (every tile on /shows and
+# on the detail pages), so formatted strings are memoized per
+# (value, format, locale); create_app() installs the filter behind an
+# lru_cache whose cache_info() reports the hit and miss counts.
+def format_datetime(value, format="medium", locale="en"):
+    # Views pass the ORM's datetime objects straight through; strings are
+    # still accepted and parsed.
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
     if format == "full":
         format = "EEEE MMMM, d, y 'at' h:mma"
     elif format == "medium":
         format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en")
+    return babel.dates.format_datetime(value, format, locale=locale)
+
+
+# ----------------------------------------------------------------------------#
+# Pagination.
+# ----------------------------------------------------------------------------#
+
+
+def page_args(default=None):
+    # Reads the cursor and page size from the query string or the posted
+    # search form, capping the size at MAX_PAGE_SIZE.
+    per_page = page_size(
+        request.values.get("per_page"),
+        default or current_app.config["PAGE_SIZE"],
+        current_app.config["MAX_PAGE_SIZE"])
+    return request.values.get("cursor") or None, per_page
+
+# ----------------------------------------------------------------------------#
+# Show filters.
+# ----------------------------------------------------------------------------#
+# /shows and /api/v1/shows take ?from=, ?to=, ?city=, ?state= and
+# ?venue_id=. They become criteria on one statement that joins Show to
+# Venue, so a date range is a range scan on ix_Show_datetime (or
+# ix_Show_venue_id_datetime for one venue) read in (datetime, id) order,
+# and the city and state match Venue through ix_Venue_state_city. The same
+# statement runs against ShowArchive on its matching indexes, and the two
+# pages are merged.
+
+SHOW_FILTERS = ("from", "to", "city", "state", "venue_id")
+
+
+def parse_bound(value, end=False):
+    # An ISO date or datetime. A bare date as the end of a range covers
+    # that whole day. Returns (datetime, inclusive).
+    try:
+        day = datetime.date.fromisoformat(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value), True
+    start = datetime.datetime.combine(day, datetime.time())
+    if end:
+        return start + datetime.timedelta(days=1), False
+    return start, True
+
+
+def show_filters():
+    # Returns the filters present in the query string. Raises ValueError
+    # for a malformed date or venue id.
+    filters = {}
+    for name in SHOW_FILTERS:
+        value = request.args.get(name, "").strip()
+        if value:
+            filters[name] = value
+    if "venue_id" in filters:
+        int(filters["venue_id"])
+    for name in ("from", "to"):
+        if name in filters:
+            parse_bound(filters[name])
+    return filters
+
+
+def filter_shows(query, filters, model=Show):
+    # `query` selects `model` (Show or ShowArchive); Venue is joined in and
+    # loaded from the same row.
+    query = query.join(model.venue).options(db.contains_eager(model.venue))
+    query = query.filter(model.datetime.isnot(None))
+    if "from" in filters:
+        start, _ = parse_bound(filters["from"])
+        query = query.filter(model.datetime >= start)
+    if "to" in filters:
+        end, inclusive = parse_bound(filters["to"], end=True)
+        query = query.filter(
+            model.datetime <= end if inclusive else model.datetime < end)
+    if "venue_id" in filters:
+        query = query.filter(model.venue_id == int(filters["venue_id"]))
+    if "state" in filters:
+        query = query.filter(Venue.state == filters["state"])
+    if "city" in filters:
+        query = query.filter(Venue.city == filters["city"])
+    return query
+
+
+def show_queries(filters):
+    # [(model, filtered query)] for each table that holds shows.
+    return [(model, filter_shows(
+        model.query.options(db.joinedload(model.artist)), filters, model))
+        for model in (ShowArchive, Show)]
+
+
+def show_sort_key(show):
+    return show.datetime, show.id
+
+
+def shows_page(filters, cursor, per_page):
+    # Returns (shows, next_cursor) across Show and ShowArchive: a keyset
+    # page from each table, merged on (datetime, id). Archived shows keep
+    # their ids, so the cursor means the same in both. Raises ValueError
+    # for a malformed cursor.
+    pages, more = [], False
+    for model, query in show_queries(filters):
+        shows, next_cursor = keyset_page(
+            query, [model.datetime, model.id], cursor, per_page)
+        pages.append(shows)
+        more = more or next_cursor is not None
+    shows = list(heapq.merge(*pages, key=show_sort_key))
+    next_cursor = None
+    if more or len(shows) > per_page:
+        shows = shows[:per_page]
+        next_cursor = encode_cursor(show_sort_key(shows[-1]))
+    return shows, next_cursor
+
+# ----------------------------------------------------------------------------#
+# Streaming.
+# ----------------------------------------------------------------------------#
+# With ?stream=1 the listing views render their whole result set instead of
+# a page. Rows are pulled from a server-side cursor in batches of
+# STREAM_YIELD_PER and fed to a streamed template, so memory stays flat and
+# the page head goes out before the query has finished.
+
+
+def stream_rows(query, format_row):
+    query = query.execution_options(stream_results=True).yield_per(
+        current_app.config["STREAM_YIELD_PER"])
+    for row in query:
+        yield format_row(row)
+
 
+def stream_page(template_name, **context):
+    # Flask 2.1 has no stream_template; this is its equivalent.
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(current_app.config["STREAM_BUFFER_SIZE"])
+    return Response(stream_with_context(stream), mimetype="text/html")
+
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+# ----------------------------------------------------------------------------#
+
+
+def cached_page(key, render, validator=None):
+    # Serves the rendered page for `key` from page_cache, rendering and
+    # storing it on a miss. The page is stored with the `validator` (the
+    # ETag) it was rendered under and only served for that same validator,
+    # so an entry made stale by another worker's write or by a show moving
+    # into the past is re-rendered rather than sent under the new ETag.
+    # Pages that will carry a flashed message are specific to one visitor,
+    # so they are neither served from nor stored in the cache.
+    if session.get("_flashes"):
+        return render()
+    entry = page_cache.get(key)
+    if entry is not None and entry[0] == validator:
+        return entry[1]
+    page = render()
+    page_cache.set(key, (validator, page))
+    return page
+
+
+def venue_page_keys(venue_id):
+    # The venue's own page and every artist page that lists one of its
+    # shows, since those show the venue's name and image.
+    artist_ids = db.session.execute(
+        billed_with("artist_id", "venue_id", venue_id)).scalars()
+    return [("venue", venue_id)] + [
+        ("artist", artist_id) for artist_id in artist_ids]
+
+
+def artist_page_keys(artist_id):
+    venue_ids = db.session.execute(
+        billed_with("venue_id", "artist_id", artist_id)).scalars()
+    return [("artist", artist_id)] + [
+        ("venue", venue_id) for venue_id in venue_ids]
+
+
+# ----------------------------------------------------------------------------#
+# Conditional GET.
+# ----------------------------------------------------------------------------#
+# Listing and detail pages derive Last-Modified and an ETag from a single
+# aggregate query over updated_at, and answer 304 before anything is loaded
+# or rendered. Besides writes, a page changes when one of its shows moves
+# from upcoming to past, so the latest show start that has already passed
+# counts as a modification too. Row counts cover deletes, which leave no
+# updated_at behind.
+
+
+def aggregate(expression, *criteria):
+    return db.session.query(expression).filter(*criteria).scalar_subquery()
+
+
+def last_updated(model, *criteria):
+    return aggregate(db.func.max(model.updated_at), *criteria)
+
+
+def last_passed_show(*criteria):
+    return aggregate(
+        db.func.max(Show.datetime),
+        Show.datetime <= datetime.datetime.now(), *criteria)
+
+
+def conditional_page(render, updated=(), passed=None, counts=(),
+                     cache_key=None):
+    # `updated` are the aggregate updated_at subqueries (UTC), `passed` the
+    # last_passed_show subquery (local time) and `counts` any row counts.
+    # With `cache_key` the body goes through cached_page, keyed on the ETag.
+    if session.get("_flashes"):
+        return render()
+    columns = list(updated) + [passed if passed is not None
+                               else db.null()] + list(counts)
+    values = db.session.query(*columns).one()
+    utc = datetime.timezone.utc
+    stamps = [value.replace(tzinfo=utc)
+              for value in values[:len(updated)] if value is not None]
+    passed_at = values[len(updated)]
+    if passed_at is not None:
+        stamps.append(passed_at.astimezone(utc))
+    last_modified = max(stamps).replace(microsecond=0) if stamps else None
+    etag = hashlib.sha1(repr(tuple(values)).encode("utf-8")).hexdigest()
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (
+            last_modified is not None and
+            request.if_modified_since is not None and
+            last_modified <= request.if_modified_since)
+    if not_modified:
+        response = Response(status=304)
+    elif cache_key is not None:
+        response = make_response(cached_page(cache_key, render, etag))
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
 
-app.jinja_env.filters["datetime"] = format_datetime
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route("/")
+@pages.route("/")
 def index():
     return render_template("pages/home.html")
 
@@ -180,32 +658,28 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues")
+@pages.route("/venues")
 def venues():
-    # TODO: replace with real venues data.
-    # num_upcoming_shows should be aggregated based on number of upcoming
-    # shows per venue.
-    cities_and_states = Venue.query.distinct(Venue.city, Venue.state).all()
-    data = []
-    for cs in cities_and_states:
-        venues_in_city_and_state = Venue.query.filter(
-            Venue.city == cs.city, Venue.state == cs.state).all()
-        formatted_venues = [
-            {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": Show.query.filter(
-                    Show.venue_id == venue.id,
-                    Show.datetime > datetime.datetime.now()).count()} for venue in venues_in_city_and_state]
-        data.append({
-            "city": cs.city,
-            "state": cs.state,
-            "venues": formatted_venues
-        })
-    return render_template("pages/venues.html", areas=data)
-
-
-@app.route("/venues/search", methods=["POST"])
+    # num_upcoming_shows is aggregated in the same query that lists the
+    # venues, see Venue.find_areas.
+    def render():
+        cursor, per_page = page_args()
+        try:
+            data, next_cursor = Venue.find_areas(
+                cursor, per_page, request.args.get("genre"))
+        except ValueError:
+            abort(400)
+        return render_template(
+            "pages/venues.html", areas=data, next_cursor=next_cursor)
+    return conditional_page(
+        render,
+        updated=[last_updated(Venue), last_updated(Show)],
+        passed=last_passed_show(),
+        counts=[aggregate(db.func.count(Venue.id))])
+
+
+@pages.route("/venues/search", methods=["POST"])
+@read_only
 def search_venues():
     # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
@@ -215,71 +689,66 @@ def search_venues():
     search_term = request.form.get("search_term", None)
     if search_term is None:
         abort(404)
-    found_results = Venue.query.filter(
-        Venue.name.ilike(
-            "%{}%".format(search_term))).all()
+    query, order_by = search.search_names(db.session, Venue, search_term)
+    cursor, per_page = page_args()
+    try:
+        rows, next_cursor = keyset_page(query, order_by, cursor, per_page)
+    except ValueError:
+        abort(400)
+    found_results = [venue for venue, rank in rows]
+    count, count_kind = estimate_count(
+        query, current_app.config["COUNT_ESTIMATE_THRESHOLD"])
+    show_counts = Venue.find_show_counts(venue.id for venue in found_results)
     data = []
     for venue in found_results:
         data.append({
             "id": venue.id,
             "name": venue.name,
-            "num_upcoming_shows": venue.find_num_upcoming_shows()
+            "num_upcoming_shows": show_counts[venue.id][0]
         })
-    count = len(found_results)
     response = {
         "count": count,
+        "count_kind": count_kind,
         "data": data
     }
     return render_template(
         "pages/search_venues.html",
         results=response,
         search_term=search_term,
+        next_cursor=next_cursor,
     )
 
 
-@app.route("/venues/<int:venue_id>")
+@pages.route("/venues/<int:venue_id>")
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-    found_venue = Venue.query.filter(Venue.id == venue_id).one_or_none()
-    if found_venue is None:
-        abort(404)
-    data = found_venue.format()
-    past_shows = Show.query.filter(
-        Show.venue_id == found_venue.id,
-        Show.datetime < datetime.datetime.now()).all()
-    upcoming_shows = Show.query.filter(
-        Show.venue_id == found_venue.id,
-        Show.datetime > datetime.datetime.now()).all()
-    format_past_shows = [{"artist_id": show.artist.id,
-                          "artist_name": show.artist.name,
-                          "artist_image_link": show.artist.image_link,
-                          "start_time": str(show.datetime)} for show in past_shows]
-    format_upcoming_shows = [{"artist_id": show.artist.id,
-                              "artist_name": show.artist.name,
-                              "artist_image_link": show.artist.image_link,
-                              "start_time": str(show.datetime)} for show in upcoming_shows]
-    num_of_upcoming_shows = len(upcoming_shows)
-    num_of_past_shows = len(past_shows)
-
-    data["past_shows"] = format_past_shows
-    data["upcoming_shows"] = format_upcoming_shows
-    data["past_shows_count"] = num_of_past_shows
-    data["upcoming_shows_count"] = num_of_upcoming_shows
-    return render_template("pages/show_venue.html", venue=data)
+    def render():
+        data = Venue.find_details(venue_id)
+        if data is None:
+            abort(404)
+        return render_template("pages/show_venue.html", venue=data)
+    return conditional_page(
+        render,
+        updated=[
+            last_updated(Venue, Venue.id == venue_id),
+            last_updated(Show, Show.venue_id == venue_id),
+            last_updated(Artist, Artist.id.in_(
+                billed_with("artist_id", "venue_id", venue_id)))],
+        passed=last_passed_show(Show.venue_id == venue_id),
+        cache_key=("venue", venue_id))
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues/create", methods=["GET"])
+@pages.route("/venues/create", methods=["GET"])
 def create_venue_form():
     form = VenueForm()
     return render_template("forms/new_venue.html", form=form)
 
 
-@app.route("/venues/create", methods=["POST"])
+@pages.route("/venues/create", methods=["POST"])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -294,13 +763,14 @@ def create_venue_submission():
                 phone=form.phone.data,
                 image_link=form.image_link.data,
                 facebook_link=form.facebook_link.data,
-                genres=",".join(form.genres.data),
+                genres=form.genres.data,
                 website_link=form.website_link.data,
                 looking_for_talent=form.seeking_talent.data,
                 seeking_description=form.seeking_description.data
             )
             db.session.add(venue)
             db.session.commit()
+            typeahead.add("venues", venue.id, venue.name)
             # on successful db insert, flash success
             flash(
                 "Venue " +
@@ -320,7 +790,7 @@ def create_venue_submission():
 
 
 
-@app.route("/venues/<venue_id>", methods=["DELETE"])
+@pages.route("/venues/<venue_id>", methods=["DELETE"])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit
@@ -328,9 +798,13 @@ def delete_venue(venue_id):
     venue_to_delete = Venue.query.filter(Venue.id == venue_id).one_or_none()
     if not venue_to_delete:
         abort(404)
+    deleted_id = venue_to_delete.id
+    stale_pages = venue_page_keys(deleted_id)
     try:
         db.session.delete(venue_to_delete)
         db.session.commit()
+        page_cache.invalidate(*stale_pages)
+        typeahead.remove("venues", deleted_id)
         return render_template("pages/venues.html")
     except BaseException:
         abort(404)
@@ -344,31 +818,43 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route("/artists")
+@pages.route("/artists")
 def artists():
-    # TODO: replace with real data returned from querying the database
-    # data = [
-    #     {
-    #         "id": 4,
-    #         "name": "Guns N Petals",
-    #     },
-    #     {
-    #         "id": 5,
-    #         "name": "Matt Quevedo",
-    #     },
-    #     {
-    #         "id": 6,
-    #         "name": "The Wild Sax Band",
-    #     },
-    # ]
-    artists = Artist.query.order_by(Artist.id).all()
+    return conditional_page(
+        render_artists,
+        updated=[last_updated(Artist)],
+        counts=[aggregate(db.func.count(Artist.id))])
+
+
+def render_artists():
+    query = Artist.query
+    genre = request.args.get("genre")
+    if genre:
+        query = query.filter(Artist.id.in_(
+            db.session.query(ArtistGenre.artist_id).filter(
+                ArtistGenre.genre == genre)))
+
+    def artist_item(artist):
+        return {"id": artist.id, "name": artist.name}
+    if request.args.get("stream"):
+        return stream_page(
+            "pages/artists.html",
+            artists=stream_rows(query.order_by(Artist.id), artist_item))
+    cursor, per_page = page_args()
+    try:
+        artists, next_cursor = keyset_page(
+            query, [Artist.id], cursor, per_page)
+    except ValueError:
+        abort(400)
     if len(artists) == 0:
         abort(404)
-    data = [{"id": artist.id, "name": artist.name} for artist in artists]
-    return render_template("pages/artists.html", artists=data)
+    data = [artist_item(artist) for artist in artists]
+    return render_template(
+        "pages/artists.html", artists=data, next_cursor=next_cursor)
 
 
-@app.route("/artists/search", methods=["POST"])
+@pages.route("/artists/search", methods=["POST"])
+@read_only
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
@@ -378,61 +864,62 @@ def search_artists():
     if search_term == "":
         abort(404)
 
-    search_results = Artist.query.filter(
-        Artist.name.ilike("%{}%".format(search_term))).all()
-
-    count = len(search_results)
+    query, order_by = search.search_names(db.session, Artist, search_term)
+    cursor, per_page = page_args()
+    try:
+        rows, next_cursor = keyset_page(query, order_by, cursor, per_page)
+    except ValueError:
+        abort(400)
+    search_results = [artist for artist, rank in rows]
+
+    count, count_kind = estimate_count(
+        query, current_app.config["COUNT_ESTIMATE_THRESHOLD"])
+    show_counts = Artist.find_show_counts(
+        artist.id for artist in search_results)
     data = [{"id": artist.id, "name": artist.name, "num_upcoming_shows":
-             artist.find_num_upcoming_shows()} for artist in search_results]
+             show_counts[artist.id][0]} for artist in search_results]
     response = {
         "count": count,
+        "count_kind": count_kind,
         "data": data
     }
     return render_template(
         "pages/search_artists.html",
         results=response,
         search_term=search_term,
+        next_cursor=next_cursor,
     )
 
 
-@app.route("/artists/<int:artist_id>")
+@pages.route("/artists/<int:artist_id>")
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    # TODO: replace with real artist data from the artist table, using
-    # artist_id
-    found_artist = Artist.query.filter(Artist.id == artist_id).one_or_none()
-    if not found_artist:
-        abort(404)
-    data = found_artist.format()
-    data["upcoming_shows"] = [
-        {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": str(
-                show.start_stime)} for show in found_artist.find_upcoming_shows()]
-    data["past_shows"] = [
-        {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": str(
-                show.datetime)} for show in found_artist.find_past_shows()]
-    data["past_shows_count"] = len(data["past_shows"])
-    data["upcoming_shows_count"] = len(data["upcoming_shows"])
-    return render_template("pages/show_artist.html", artist=data)
+    def render():
+        data = Artist.find_details(artist_id)
+        if data is None:
+            abort(404)
+        return render_template("pages/show_artist.html", artist=data)
+    return conditional_page(
+        render,
+        updated=[
+            last_updated(Artist, Artist.id == artist_id),
+            last_updated(Show, Show.artist_id == artist_id),
+            last_updated(Venue, Venue.id.in_(
+                billed_with("venue_id", "artist_id", artist_id)))],
+        passed=last_passed_show(Show.artist_id == artist_id),
+        cache_key=("artist", artist_id))
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route("/artists/<int:artist_id>/edit", methods=["GET"])
+@pages.route("/artists/<int:artist_id>/edit", methods=["GET"])
 def edit_artist(artist_id):
     form = ArtistForm()
     artist = Artist.query.filter(Artist.id == artist_id).one_or_none()
     if not artist:
         abort(404)
     form.name.data = artist.name
-    form.genres.data = artist.genres.split(',')
+    form.genres.data = list(artist.genres)
     form.city.data = artist.city
     form.state.data = artist.state
     form.phone.data = artist.phone
@@ -445,7 +932,7 @@ def edit_artist(artist_id):
     return render_template("forms/edit_artist.html", form=form, artist=artist)
 
 
-@app.route("/artists/<int:artist_id>/edit", methods=["POST"])
+@pages.route("/artists/<int:artist_id>/edit", methods=["POST"])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -455,7 +942,7 @@ def edit_artist_submission(artist_id):
     form = ArtistForm(request.form)
     if form.validate():
         artist.name = form.name.data
-        artist.genres = form.name.data.join(",")
+        artist.genres = form.genres.data
         artist.city = form.city.data
         artist.state = form.state.data
         artist.phone = form.phone.data
@@ -466,11 +953,13 @@ def edit_artist_submission(artist_id):
         artist.seeking_description = form.seeking_description.data
         db.session.add(artist)
         db.session.commit()
+        page_cache.invalidate(*artist_page_keys(artist_id))
+        typeahead.add("artists", artist_id, form.name.data)
         flash(f"Artist {artist.name} has been edited")
-    return redirect(url_for("show_artist", artist_id=artist_id))
+    return redirect(url_for("pages.show_artist", artist_id=artist_id))
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["GET"])
+@pages.route("/venues/<int:venue_id>/edit", methods=["GET"])
 def edit_venue(venue_id):
     form = VenueForm()
     # TODO: populate form with values from venue with ID <venue_id>
@@ -478,7 +967,7 @@ def edit_venue(venue_id):
     if venue is None:
         abort(404)
     form.name.data = venue.name
-    form.genres.data = venue.genres.split(',')
+    form.genres.data = list(venue.genres)
     form.address.data = venue.address
     form.city.data = venue.city
     form.state.data = venue.state
@@ -491,7 +980,7 @@ def edit_venue(venue_id):
     return render_template("forms/edit_venue.html", form=form, venue=venue)
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["POST"])
+@pages.route("/venues/<int:venue_id>/edit", methods=["POST"])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
@@ -501,7 +990,7 @@ def edit_venue_submission(venue_id):
     form = VenueForm(request.form)
     if form.validate():
         venue.name = form.name.data
-        venue.genres = ",".join(form.genres.data)
+        venue.genres = form.genres.data
         venue.address = form.address.data
         venue.city = form.city.data
         venue.state = form.state.data
@@ -511,20 +1000,22 @@ def edit_venue_submission(venue_id):
         venue.seeking_description = form.seeking_description.data
         db.session.add(venue)
         db.session.commit()
-    return redirect(url_for("show_venue", venue_id=venue_id))
+        page_cache.invalidate(*venue_page_keys(venue_id))
+        typeahead.add("venues", venue_id, form.name.data)
+    return redirect(url_for("pages.show_venue", venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route("/artists/create", methods=["GET"])
+@pages.route("/artists/create", methods=["GET"])
 def create_artist_form():
     form = ArtistForm()
     return render_template("forms/new_artist.html", form=form)
 
 
-@app.route("/artists/create", methods=["POST"])
+@pages.route("/artists/create", methods=["POST"])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
@@ -540,12 +1031,13 @@ def create_artist_submission():
                 phone=form.phone.data,
                 image_link=form.image_link.data,
                 facebook_link=form.facebook_link.data,
-                genres=",".join(form.genres.data),
+                genres=form.genres.data,
                 website_link=form.website_link.data,
                 looking_for_venue=form.seeking_venue.data,
                 seeking_description=form.seeking_description.data)
             db.session.add(artist)
             db.session.commit()
+            typeahead.add("artists", artist.id, artist.name)
             # on successful db insert, flash success
             flash(
                 "Artist " +
@@ -566,32 +1058,61 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route("/shows")
+@pages.route("/shows")
 def shows():
     # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    shows = Show.query.all()
-    data = []
-    for show in shows:
-        data.append({
+    return conditional_page(
+        render_shows,
+        updated=[last_updated(Show), last_updated(Venue),
+                 last_updated(Artist)],
+        counts=[aggregate(db.func.count(Show.id)),
+                aggregate(db.func.count(ShowArchive.id))])
+
+
+def render_shows():
+    # Venue and Artist are joined into the same statement, and the page is
+    # addressed by a (datetime, id) keyset cursor rather than an OFFSET.
+    # Archived shows are read the same way and merged in, see shows_page.
+    try:
+        filters = show_filters()
+    except ValueError:
+        abort(400)
+
+    def show_tile(show):
+        return {
             "venue_id": show.venue_id,
             "venue_name": show.venue.name,
             "artist_id": show.artist_id,
             "artist_name": show.artist.name,
             "artist_image_link": show.artist.image_link,
-            "start_time": str(show.datetime)
-        })
-    return render_template("pages/shows.html", shows=data)
+            "start_time": show.datetime
+        }
+    if request.args.get("stream"):
+        shows = heapq.merge(*[
+            stream_rows(query.order_by(model.datetime, model.id),
+                        lambda show: show)
+            for model, query in show_queries(filters)], key=show_sort_key)
+        return stream_page(
+            "pages/shows.html", shows=map(show_tile, shows), filters=filters)
+    cursor, per_page = page_args(current_app.config["SHOWS_PER_PAGE"])
+    try:
+        shows, next_cursor = shows_page(filters, cursor, per_page)
+    except ValueError:
+        abort(400)
+    data = [show_tile(show) for show in shows]
+    return render_template(
+        "pages/shows.html", shows=data, next_cursor=next_cursor,
+        filters=filters)
 
 
-@app.route("/shows/create")
+@pages.route("/shows/create")
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template("forms/new_show.html", form=form)
 
 
-@app.route("/shows/create", methods=["POST"])
+@pages.route("/shows/create", methods=["POST"])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
@@ -605,6 +1126,8 @@ def create_show_submission():
             )
             db.session.add(show)
             db.session.commit()
+            page_cache.invalidate(
+                ("venue", show.venue_id), ("artist", show.artist_id))
             flash('Show was successfully listed!')
             return render_template('pages/home.html')
         except BaseException:
@@ -612,24 +1135,363 @@ def create_show_submission():
     return render_template('forms/new_show.html', form=form)
 
 
-@app.errorhandler(404)
+#  JSON API
+#  ----------------------------------------------------------------
+# Versioned API over the same format() dicts the pages use. Bodies are
+# serialized straight to JSON (no templates); reads carry a strong ETag, so
+# a client polling unchanged data gets a 304 instead of a payload.
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(
+        "{} is not JSON serializable".format(type(value).__name__))
+
+
+def json_response(payload, status=200):
+    body = json.dumps(
+        payload, separators=(",", ":"), sort_keys=True,
+        default=_json_default).encode("utf-8")
+    response = Response(body, status, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    return response.make_conditional(request)
+
+
+@api.route("/venues")
+def api_venues():
+    query = Venue.query.options(db.selectinload(Venue.genre_links))
+    cursor, per_page = page_args()
+    try:
+        venues, next_cursor = keyset_page(query, [Venue.id], cursor, per_page)
+    except ValueError:
+        abort(400)
+    return json_response({
+        "data": [venue.format() for venue in venues],
+        "next_cursor": next_cursor,
+    })
+
+
+@api.route("/venues/<int:venue_id>")
+def api_venue(venue_id):
+    data = Venue.find_details(venue_id)
+    if data is None:
+        abort(404)
+    return json_response({"data": data})
+
+
+@api.route("/artists")
+def api_artists():
+    query = Artist.query.options(db.selectinload(Artist.genre_links))
+    cursor, per_page = page_args()
+    try:
+        artists, next_cursor = keyset_page(
+            query, [Artist.id], cursor, per_page)
+    except ValueError:
+        abort(400)
+    return json_response({
+        "data": [artist.format() for artist in artists],
+        "next_cursor": next_cursor,
+    })
+
+
+@api.route("/artists/<int:artist_id>")
+def api_artist(artist_id):
+    data = Artist.find_details(artist_id)
+    if data is None:
+        abort(404)
+    return json_response({"data": data})
+
+
+@api.route("/<any(venues, artists):kind>/autocomplete")
+def api_autocomplete(kind):
+    # Name completion for the show form's pickers, answered from the
+    # in-process typeahead index: [{"id": .., "name": ..}, ...].
+    limit = page_size(
+        request.args.get("limit"), current_app.config["TYPEAHEAD_LIMIT"],
+        current_app.config["TYPEAHEAD_LIMIT"])
+    matches = typeahead.search(kind, request.args.get("q", ""), limit)
+    return json_response({
+        "data": [{"id": id, "name": name} for id, name in matches]})
+
+
+@api.route("/shows")
+def api_shows():
+    cursor, per_page = page_args()
+    try:
+        shows, next_cursor = shows_page(show_filters(), cursor, per_page)
+    except ValueError:
+        abort(400)
+    return json_response({
+        "data": [{
+            "id": show.id,
+            "venue_id": show.venue_id,
+            "venue_name": show.venue.name,
+            "artist_id": show.artist_id,
+            "artist_name": show.artist.name,
+            "artist_image_link": show.artist.image_link,
+            "start_time": show.datetime,
+        } for show in shows],
+        "next_cursor": next_cursor,
+    })
+
+
+@api.route("/shows/batch", methods=["POST"])
+def api_schedule_shows():
+    # Schedules a whole tour in one request:
+    #   {"shows": [{"artist_id": 1, "venue_id": 2,
+    #               "start_time": "2030-05-01 20:00:00"}, ...]}
+    # Every entry is validated with the ShowForm rules and every referenced
+    # venue and artist is checked in one IN query. Either all shows are
+    # created in one transaction (201), or none are and the response lists
+    # the errors of each failing entry by its index (422), or says that a
+    # concurrent change got in the way (409).
+    payload = request.get_json(silent=True)
+    entries = payload.get("shows") if isinstance(payload, dict) else payload
+    if not isinstance(entries, list) or not entries:
+        abort(400, "Expected a non-empty list of shows.")
+    if len(entries) > current_app.config["SHOW_BATCH_MAX"]:
+        abort(400, "At most {} shows per batch.".format(
+            current_app.config["SHOW_BATCH_MAX"]))
+    spec = IMPORT_SPECS["shows"]
+    errors = {}
+    valid = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors[index] = {"show": ["Expected an object."]}
+            continue
+        record, entry_errors = validate_row(spec, entry)
+        if entry_errors:
+            errors[index] = entry_errors
+        else:
+            valid.append((index, record))
+    conn = db.session.connection()
+    records = [record for _, record in valid]
+    for (index, _), entry_errors in zip(
+            valid, check_references(conn, spec, records)):
+        if entry_errors:
+            errors[index] = entry_errors
+    if errors:
+        db.session.rollback()
+        return json_response({"errors": [
+            {"index": index, "errors": errors[index]}
+            for index in sorted(errors)]}, 422)
+    try:
+        ids = insert_chunk(conn, spec, records)
+        db.session.commit()
+    except (IntegrityError, conn.dialect.dbapi.IntegrityError):
+        # Lost a race with a concurrent write, e.g. a venue or artist
+        # deleted since the reference check; nothing was created.
+        db.session.rollback()
+        abort(409, "The shows conflict with a concurrent change; "
+                   "retry the batch.")
+    except BaseException:
+        db.session.rollback()
+        raise
+    page_cache.invalidate(*itertools.chain.from_iterable(
+        (("venue", values["venue_id"]), ("artist", values["artist_id"]))
+        for values, _ in records))
+    return json_response({"data": [{
+        "id": id,
+        "venue_id": values["venue_id"],
+        "artist_id": values["artist_id"],
+        "start_time": values["datetime"],
+    } for id, (values, _) in zip(ids, records)]}, 201)
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(409)
+def api_error(error):
+    return json_response({"error": error.description}, error.code)
+
+
+
+#  Internal
+#  ----------------------------------------------------------------
+
+
+def internal_only():
+    # Operational endpoints need the INTERNAL_TOKEN bearer token; only a
+    # debug server also answers INTERNAL_ALLOWED_ADDRS without it.
+    config = current_app.config
+    token = config["INTERNAL_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(
+            authorization.encode("utf-8"),
+            "Bearer {}".format(token).encode("utf-8")):
+        return
+    if current_app.debug and \
+            request.remote_addr in config["INTERNAL_ALLOWED_ADDRS"]:
+        return
+    abort(404)
+
+
+@pages.route("/internal/pool")
+def internal_pool():
+    internal_only()
+    pool = db.get_engine().pool
+    if isinstance(pool, InstrumentedQueuePool):
+        data = pool.status_dict()
+    else:
+        data = {"status": pool.status()}
+    data["class"] = type(pool).__name__
+    return jsonify(data)
+
+
+#  Commands
+#  ----------------------------------------------------------------
+
+
+VENUE_FIELDS = ("name", "city", "state", "address", "phone", "image_link",
+                "facebook_link", "website_link", "seeking_description")
+ARTIST_FIELDS = ("name", "city", "state", "phone", "image_link",
+                 "facebook_link", "website_link", "seeking_description")
+
+IMPORT_SPECS = {
+    "venues": ImportSpec(
+        model=Venue, form=VenueForm,
+        fields=dict(
+            dict((field, field) for field in VENUE_FIELDS),
+            seeking_talent="looking_for_talent"),
+        booleans=("seeking_talent",),
+        genre_model=VenueGenre, genre_key="venue_id", references={}),
+    "artists": ImportSpec(
+        model=Artist, form=ArtistForm,
+        fields=dict(
+            dict((field, field) for field in ARTIST_FIELDS),
+            seeking_venue="looking_for_venue"),
+        booleans=("seeking_venue",),
+        genre_model=ArtistGenre, genre_key="artist_id", references={}),
+    "shows": ImportSpec(
+        model=Show, form=ShowForm,
+        fields={"artist_id": "artist_id", "venue_id": "venue_id",
+                "start_time": "datetime"},
+        booleans=(),
+        genre_model=None, genre_key=None,
+        references={"artist_id": Artist, "venue_id": Venue}),
+}
+
+
+@pages.cli.command("import")
+@click.argument("kind", type=click.Choice(sorted(IMPORT_SPECS)))
+@click.argument("paths", nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", type=click.IntRange(1),
+              help="Rows validated and written per transaction "
+                   "[default: IMPORT_CHUNK_SIZE]")
+@click.option("--rejects", "reject_path", type=click.Path(dir_okay=False),
+              help="JSONL file for rejected rows "
+                   "[default: <first path>.rejects.jsonl]")
+def import_command(kind, paths, chunk_size, reject_path):
+    """Bulk-load venues, artists or shows from CSV or JSONL files.
+
+    Rows are validated with the same forms as the create pages; genres are
+    a list in JSONL and a comma-separated string in CSV. Files ending in
+    .jsonl, .ndjson or .json are read as JSONL, anything else as CSV.
+    """
+    chunk_size = chunk_size or current_app.config["IMPORT_CHUNK_SIZE"]
+    reject_path = reject_path or paths[0] + ".rejects.jsonl"
+    with open(reject_path, "w", encoding="utf-8") as rejects:
+        report = run_import(
+            db.engine, IMPORT_SPECS[kind], paths, chunk_size, rejects,
+            echo=click.echo)
+    click.echo("{}: {}".format(kind, report))
+    if report.rejected:
+        click.echo("rejected rows written to {}".format(reject_path))
+
+
+@pages.cli.command("archive-shows")
+@click.option("--days", type=click.IntRange(0),
+              help="Archive shows that started more than this many days "
+                   "ago [default: SHOW_ARCHIVE_DAYS]")
+@click.option("--batch-size", type=click.IntRange(1),
+              help="Shows moved per transaction "
+                   "[default: SHOW_ARCHIVE_BATCH_SIZE]")
+@click.option("--pause", type=click.FloatRange(0), default=0,
+              help="Seconds to wait between batches")
+def archive_shows_command(days, batch_size, pause):
+    """Move past shows out of Show into ShowArchive.
+
+    Meant to run periodically, e.g. nightly from cron. Every batch is its
+    own transaction, so the command can be interrupted and run again.
+    """
+    if days is None:
+        days = current_app.config["SHOW_ARCHIVE_DAYS"]
+    batch_size = batch_size or current_app.config["SHOW_ARCHIVE_BATCH_SIZE"]
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    moved = archive_shows(
+        db.engine, Show.__table__, ShowArchive.__table__, cutoff,
+        batch_size, pause, echo=click.echo)
+    click.echo("{} shows that started before {:%Y-%m-%d %H:%M} archived"
+               .format(moved, cutoff))
+
+
+@pages.cli.command("build-assets")
+def build_assets_command():
+    """Minify, fingerprint and gzip static/ into static/build/."""
+    build_assets(current_app.static_folder, echo=click.echo)
+
+
+@pages.route("/internal/logging")
+def internal_logging():
+    internal_only()
+    return jsonify(log_pipeline.status_dict())
+
+
+@pages.app_errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
 
 
-@app.errorhandler(500)
+@pages.app_errorhandler(500)
 def server_error(error):
     return render_template("errors/500.html"), 500
 
 
-if not app.debug:
-    file_handler = FileHandler("error.log")
-    file_handler.setFormatter(Formatter(
-        "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info("errors")
+# ----------------------------------------------------------------------------#
+# App factory.
+# ----------------------------------------------------------------------------#
+
+
+def create_app(config=None):
+    # Importing this module only defines models, views and unbound
+    # extensions; the app itself is built here. A preforking server can
+    # therefore build it once in the master and share it copy-on-write with
+    # its workers:
+    #
+    #   gunicorn --preload "app:create_app()"
+    #
+    # Engines drop connections inherited from the master on fork (see
+    # PooledSQLAlchemy), and the log listener restarts in each worker.
+    app = Flask(__name__)
+    app.config.from_object("config")
+    if config:
+        app.config.update(config)
+    if not app.config["SECRET_KEY"]:
+        if not app.debug:
+            raise RuntimeError(
+                "SECRET_KEY must be set: sessions (and the read-your-writes "
+                "pin) have to verify in every worker and after restarts.")
+        app.config["SECRET_KEY"] = "dev"
+
+    db.init_app(app)
+    sql_stats.init_app(app)
+    page_cache.init_app(app)
+    typeahead.init_app(app)
+    app.jinja_env.filters["datetime"] = functools.lru_cache(
+        maxsize=app.config["DATETIME_FORMAT_CACHE_SIZE"])(format_datetime)
+    migrate.init_app(app, db)
+
+    assets.init_app(app)
+    app.register_blueprint(pages)
+    app.register_blueprint(api)
+    if not app.debug:
+        log_pipeline.init_app(app)
+    return app
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -637,11 +1499,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == "__main__":
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 """
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 """
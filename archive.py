@@ -0,0 +1,63 @@
+import time
+
+import sqlalchemy as sa
+
+
+# ----------------------------------------------------------------------------#
+# Show archive.
+# ----------------------------------------------------------------------------#
+# Past shows are never edited, so `flask archive-shows` moves those that
+# started before a horizon out of Show into ShowArchive, which has the same
+# columns. Show then holds only recent and upcoming shows, and the
+# upcoming-show lookups and their indexes stay the same size however much
+# history piles up. The views that list past shows read both tables.
+#
+# Rows move in batches, each in its own short transaction that copies and
+# deletes the same ids, so no show is ever in both tables or in neither.
+# On Postgres a batch is one statement (DELETE ... RETURNING feeding the
+# INSERT) and skips rows locked by a concurrent edit.
+
+
+def archive_batch(conn, show, archive, cutoff, batch_size):
+    # Moves up to `batch_size` of the oldest shows that started before
+    # `cutoff`; returns how many moved.
+    columns = [show.c[column.name] for column in archive.columns]
+    oldest = sa.select(show.c.id).where(
+        show.c.datetime < cutoff
+    ).order_by(show.c.datetime, show.c.id).limit(batch_size)
+    if conn.dialect.name == "postgresql":
+        moved = show.delete().where(
+            show.c.id.in_(oldest.with_for_update(skip_locked=True))
+        ).returning(*columns).cte("moved")
+        result = conn.execute(archive.insert().from_select(
+            [column.name for column in columns], sa.select(moved)))
+        return result.rowcount
+    # Without a sequence a new show takes max(id) + 1, which could hand out
+    # an archived show's id again; the newest id therefore stays in Show.
+    newest = sa.select(sa.func.max(show.c.id)).scalar_subquery()
+    ids = list(conn.execute(oldest.where(show.c.id < newest)).scalars())
+    if not ids:
+        return 0
+    conn.execute(archive.insert().from_select(
+        [column.name for column in columns],
+        sa.select(*columns).where(show.c.id.in_(ids))))
+    conn.execute(show.delete().where(show.c.id.in_(ids)))
+    return len(ids)
+
+
+def archive_shows(engine, show, archive, cutoff, batch_size, pause=0,
+                  echo=print):
+    # Moves every show that started before `cutoff`, `pause` seconds apart
+    # per batch so replicas and concurrent writers can keep up. Returns the
+    # number of shows moved.
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            moved = archive_batch(conn, show, archive, cutoff, batch_size)
+        total += moved
+        if moved:
+            echo("{} shows archived".format(total))
+        if moved < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory
+
+
+# ----------------------------------------------------------------------------#
+# Static assets.
+# ----------------------------------------------------------------------------#
+# `flask build-assets` copies every file under static/ to static/build/,
+# minifying CSS and JS that are not already .min, naming each copy after a
+# hash of its content (css/main.css -> css/main.1a2b3c4d5e6f.css), and
+# writing a .gz sibling where that is smaller. manifest.json maps source
+# names to built ones.
+#
+# With USE_ASSET_MANIFEST on, url_for("static", filename="css/main.css")
+# returns the hashed URL. Built files never change under a given name, so
+# they are served with a one-year immutable Cache-Control, and as the
+# precompressed .gz body when the client accepts gzip. Files missing from
+# the manifest are served as before.
+
+BUILD_DIR = "build"
+MANIFEST = "manifest.json"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = frozenset([
+    ".css", ".js", ".map", ".svg", ".ttf", ".eot", ".otf", ".json", ".txt"])
+SKIPPED = frozenset([".gitkeep", ".DS_Store"])
+
+# Quoted strings (group 1) are matched together with comments so that
+# neither is looked for inside the other.
+CSS_STRING_OR_COMMENT = re.compile(
+    r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|/\*.*?\*/""", re.S)
+CSS_SPACE = re.compile(r"\s*([{};,])\s*")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _squeeze_css(text):
+    text = re.sub(r"\s+", " ", text)
+    text = CSS_SPACE.sub(r"\1", text)
+    return text.replace(";}", "}")
+
+
+def minify_css(text):
+    # Drops comments and squeezes whitespace between quoted strings; the
+    # strings themselves are copied as they are.
+    parts, code = [], []
+    start = 0
+    for match in CSS_STRING_OR_COMMENT.finditer(text):
+        code.append(text[start:match.start()])
+        if match.group(1):
+            parts.append(_squeeze_css("".join(code)))
+            parts.append(match.group(1))
+            code = []
+        else:
+            # A comment separates tokens as whitespace does.
+            code.append(" ")
+        start = match.end()
+    code.append(text[start:])
+    parts.append(_squeeze_css("".join(code)))
+    return "".join(parts).strip()
+
+
+def minify_js(text):
+    # Conservative: drops indentation, blank lines and whole-line //
+    # comments only, which cannot change what the script does.
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(
+        line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def rewrite_css_urls(text, name, manifest):
+    # Points url(...) references at the hashed copies; the directory layout
+    # under build/ mirrors static/, so relative paths still resolve.
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, target = match.groups()
+        if re.match(r"([a-z]+:|/)", target):
+            return match.group(0)
+        end = re.search(r"[?#]|$", target).start()
+        resolved = posixpath.normpath(
+            posixpath.join(directory, target[:end]))
+        if resolved not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[resolved], directory)
+        return "url({0}{1}{2}{0})".format(quote, hashed, target[end:])
+    return CSS_URL.sub(replace, text)
+
+
+def hashed_name(name, content):
+    root, ext = posixpath.splitext(name)
+    return "{}.{}{}".format(root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def source_files(static_folder):
+    for directory, dirnames, filenames in os.walk(static_folder):
+        if directory == static_folder and BUILD_DIR in dirnames:
+            dirnames.remove(BUILD_DIR)
+        for filename in sorted(filenames):
+            if filename in SKIPPED:
+                continue
+            path = os.path.join(directory, filename)
+            yield os.path.relpath(path, static_folder).replace(os.sep, "/")
+
+
+def build_assets(static_folder, echo=print):
+    # Returns the manifest. Stylesheets are built last so their url()
+    # references can point at already hashed fonts and images.
+    output = os.path.join(static_folder, BUILD_DIR)
+    names = sorted(source_files(static_folder),
+                   key=lambda name: (name.endswith(".css"), name))
+    manifest = {}
+    before = after = 0
+    for name in names:
+        with open(os.path.join(static_folder, name), "rb") as f:
+            content = f.read()
+        before += len(content)
+        minified = ".min." in posixpath.basename(name)
+        if name.endswith(".css"):
+            text = content.decode("utf-8")
+            if not minified:
+                text = minify_css(text)
+            content = rewrite_css_urls(text, name, manifest).encode("utf-8")
+        elif name.endswith(".js") and not minified:
+            content = minify_js(content.decode("utf-8")).encode("utf-8")
+        manifest[name] = hashed_name(name, content)
+        target = os.path.join(output, manifest[name])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(content)
+        after += len(content)
+        if posixpath.splitext(name)[1] in COMPRESSIBLE:
+            # mtime=0 keeps the .gz byte-identical between builds.
+            compressed = gzip.compress(content, 9, mtime=0)
+            if len(compressed) < len(content):
+                with open(target + ".gz", "wb") as f:
+                    f.write(compressed)
+    with open(os.path.join(output, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    echo("{} files, {} -> {} bytes before compression".format(
+        len(manifest), before, after))
+    return manifest
+
+
+class Assets(object):
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.built = frozenset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST)
+        if not app.config["USE_ASSET_MANIFEST"] or not os.path.exists(path):
+            return
+        with open(path) as f:
+            self.manifest = json.load(f)
+        self.built = frozenset(
+            posixpath.join(BUILD_DIR, name)
+            for name in self.manifest.values())
+        self.static_folder = app.static_folder
+        app.url_defaults(self._hashed_url)
+        app.view_functions["static"] = self._send_static
+        self._send_unbuilt = app.send_static_file
+
+    def _hashed_url(self, endpoint, values):
+        if endpoint == "static" and values.get("filename") in self.manifest:
+            values["filename"] = posixpath.join(
+                BUILD_DIR, self.manifest[values["filename"]])
+
+    def _send_static(self, filename):
+        if filename not in self.built:
+            return self._send_unbuilt(filename)
+        mimetype, _ = mimetypes.guess_type(filename)
+        gzipped = (
+            "gzip" in request.accept_encodings and
+            os.path.exists(os.path.join(self.static_folder, filename + ".gz")))
+        response = send_from_directory(
+            self.static_folder, filename + ".gz" if gzipped else filename,
+            mimetype=mimetype or "application/octet-stream",
+            max_age=IMMUTABLE_MAX_AGE)
+        if gzipped:
+            response.content_encoding = "gzip"
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
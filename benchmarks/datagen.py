@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------#
+# Synthetic data generator.
+# ----------------------------------------------------------------------------#
+# Fills an empty schema with a reproducible set of venues, artists, genres
+# and shows. The same seed always produces the same rows, so two benchmark
+# runs against freshly generated databases measure the same data. Rows are
+# written in chunks through importer.write_rows: COPY on Postgres, one
+# executemany elsewhere.
+
+import datetime
+import random
+
+from app import Artist, ArtistGenre, Show, Venue, VenueGenre, db
+from forms import VenueForm
+from importer import write_rows
+
+WORDS = (
+    "blue", "red", "velvet", "electric", "golden", "hidden", "iron", "lunar",
+    "midnight", "neon", "silver", "wild", "crystal", "echo", "harbor",
+    "jazz", "riot", "rose", "thunder", "violet", "wolf", "zen", "atlas",
+    "ember", "grove", "orbit", "pulse", "saint", "tide", "union")
+VENUE_KINDS = ("Hall", "Lounge", "Club", "Theatre", "Room", "Garden", "Bar")
+CITIES = (
+    ("San Francisco", "CA"), ("Los Angeles", "CA"), ("New York", "NY"),
+    ("Brooklyn", "NY"), ("Austin", "TX"), ("Houston", "TX"),
+    ("Chicago", "IL"), ("Seattle", "WA"), ("Portland", "OR"),
+    ("Nashville", "TN"), ("New Orleans", "LA"), ("Denver", "CO"))
+GENRES = [value for value, _ in VenueForm.genres.kwargs["choices"]]
+
+
+def name(rng, suffix=None):
+    words = [rng.choice(WORDS).capitalize() for _ in range(2)]
+    if suffix:
+        words.append(suffix)
+    return " ".join(words)
+
+
+def profiles(rng, count, now, venues=False):
+    for id in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        label = name(rng, rng.choice(VENUE_KINDS) if venues else None)
+        yield id, {
+            "id": id,
+            "name": "{} {}".format(label, id),
+            "city": city,
+            "state": state,
+            "phone": "555-{:03d}-{:04d}".format(
+                rng.randint(0, 999), rng.randint(0, 9999)),
+            "image_link": "https://example.com/{}.jpg".format(id),
+            "facebook_link": "https://www.facebook.com/{}".format(id),
+            "website_link": "https://example.com/{}".format(id),
+            "seeking_description": None,
+            "updated_at": now,
+        }, rng.sample(GENRES, rng.randint(1, 3))
+
+
+def write_profiles(conn, rng, model, genre_model, genre_key, count, chunk,
+                   now, venues=False):
+    rows, genre_rows = [], []
+    for id, row, genres in profiles(rng, count, now, venues=venues):
+        if venues:
+            row.update(address="{} {} St".format(
+                rng.randint(1, 9999), rng.choice(WORDS).capitalize()),
+                looking_for_talent=rng.random() < 0.3)
+        else:
+            row.update(looking_for_venue=rng.random() < 0.3)
+        rows.append(row)
+        genre_rows.extend({genre_key: id, "genre": g} for g in genres)
+        if len(rows) >= chunk:
+            write_rows(conn, model.__table__, rows)
+            write_rows(conn, genre_model.__table__, genre_rows)
+            rows, genre_rows = [], []
+    write_rows(conn, model.__table__, rows)
+    write_rows(conn, genre_model.__table__, genre_rows)
+
+
+def seed(engine, num_venues, num_artists, num_shows, seed=0, chunk=10000,
+         echo=print):
+    # Drops and recreates every table on `engine`, then fills them.
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    with engine.begin() as conn:
+        echo("  {} venues".format(num_venues))
+        write_profiles(conn, rng, Venue, VenueGenre, "venue_id", num_venues,
+                       chunk, now, venues=True)
+        echo("  {} artists".format(num_artists))
+        write_profiles(conn, rng, Artist, ArtistGenre, "artist_id",
+                       num_artists, chunk, now)
+        echo("  {} shows".format(num_shows))
+        # Two years either side of now, so every page has both past and
+        # upcoming shows.
+        for start in range(0, num_shows, chunk):
+            write_rows(conn, Show.__table__, [
+                {"id": id,
+                 "venue_id": rng.randint(1, num_venues),
+                 "artist_id": rng.randint(1, num_artists),
+                 "datetime": now + datetime.timedelta(
+                     minutes=rng.randint(-2 * 525600, 2 * 525600)),
+                 "updated_at": now}
+                for id in range(
+                    start + 1, min(start + chunk, num_shows) + 1)])
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            for model in (Venue, Artist, Show):
+                # Explicit ids bypass the serial sequences.
+                conn.exec_driver_sql(
+                    "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+                    "(SELECT max(id) FROM \"{0}\"))".format(
+                        model.__tablename__))
+            for model in (Venue, Artist, Show, VenueGenre, ArtistGenre):
+                conn.exec_driver_sql(
+                    'ANALYZE "{}"'.format(model.__tablename__))
@@ -0,0 +1,244 @@
+# ----------------------------------------------------------------------------#
+# Route benchmark.
+# ----------------------------------------------------------------------------#
+# Generates a synthetic database (see datagen.py), drives every page and API
+# route through the Flask test client, and records per route the p50, p95
+# and p99 latency, the number of SQL statements per request and the peak
+# Python memory of one request. The results are compared with a JSON
+# baseline; the script exits non-zero if any route got slower, issues more
+# queries or allocates more than the baseline allows.
+#
+#   python benchmarks/routes.py --update             # record a baseline
+#   python benchmarks/routes.py                      # compare against it
+#   python benchmarks/routes.py --venues 10000 --artists 100000 \
+#       --shows 1000000 --database-url postgresql://...
+#
+# The target database is dropped and recreated (unless --reuse is given),
+# so never point it at real data. Baselines are only comparable between
+# runs with the same volumes, seed and database.
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+
+def routes(args):
+    # (name, method, request kwargs factory)
+    def get(path):
+        return lambda rng: {"path": path}
+
+    def search(path):
+        return lambda rng: {"path": path, "data": {
+            "search_term": rng.choice(datagen.WORDS)}}
+
+    def shows_this_week(rng):
+        city, state = rng.choice(datagen.CITIES)
+        start = datetime.date.today()
+        return {"path": "/shows", "query_string": {
+            "city": city, "state": state, "from": start.isoformat(),
+            "to": (start + datetime.timedelta(days=7)).isoformat()}}
+    return [
+        ("home", "GET", get("/")),
+        ("venues", "GET", get("/venues")),
+        ("artists", "GET", get("/artists")),
+        ("shows", "GET", get("/shows")),
+        ("shows_filtered", "GET", shows_this_week),
+        ("venue", "GET", lambda rng: {
+            "path": "/venues/{}".format(rng.randint(1, args.venues))}),
+        ("artist", "GET", lambda rng: {
+            "path": "/artists/{}".format(rng.randint(1, args.artists))}),
+        ("search_venues", "POST", search("/venues/search")),
+        ("search_artists", "POST", search("/artists/search")),
+        ("api_venues", "GET", get("/api/v1/venues")),
+        ("api_artists", "GET", get("/api/v1/artists")),
+        ("api_shows", "GET", get("/api/v1/shows")),
+        ("api_venue", "GET", lambda rng: {
+            "path": "/api/v1/venues/{}".format(rng.randint(1, args.venues))}),
+    ]
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an already sorted list.
+    index = max(0, min(len(values) - 1,
+                       int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def measure(client, method, make_kwargs, rng, requests, warmup, counter):
+    def call():
+        kwargs = make_kwargs(rng)
+        response = client.open(method=method, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError("{} {} returned {}".format(
+                method, kwargs["path"], response.status_code))
+        return response
+
+    for _ in range(warmup):
+        call()
+    timings, queries = [], []
+    for _ in range(requests):
+        counter[0] = 0
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter[0])
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "queries": max(queries),
+        "peak_kb": round(peak / 1024.0, 1),
+    }
+
+
+def compare(baseline, results, args):
+    # Returns the list of regressions, printing one line per route.
+    regressions = []
+    print("{:<16} {:>10} {:>10} {:>10} {:>8} {:>10}".format(
+        "route", "p50 ms", "p95 ms", "p99 ms", "queries", "peak KiB"))
+    for name, result in results.items():
+        print("{:<16} {:>10.2f} {:>10.2f} {:>10.2f} {:>8d} {:>10.1f}".format(
+            name, result["p50_ms"], result["p95_ms"], result["p99_ms"],
+            result["queries"], result["peak_kb"]))
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            limit = max(before[key] * (1 + args.threshold),
+                        before[key] + args.min_delta_ms)
+            if result[key] > limit:
+                regressions.append("{}: {} {:.2f} > {:.2f} (baseline {:.2f})"
+                                   .format(name, key, result[key], limit,
+                                           before[key]))
+        if result["queries"] > before["queries"]:
+            regressions.append("{}: queries {} > baseline {}".format(
+                name, result["queries"], before["queries"]))
+        limit = before["peak_kb"] * (1 + args.threshold)
+        if result["peak_kb"] > limit:
+            regressions.append("{}: peak {:.1f} KiB > {:.1f} (baseline {:.1f})"
+                               .format(name, result["peak_kb"], limit,
+                                       before["peak_kb"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every route against a synthetic database.")
+    parser.add_argument(
+        "--database-url", default="sqlite:///benchmark_routes.db")
+    parser.add_argument("--venues", type=int, default=1000)
+    parser.add_argument("--artists", type=int, default=10000)
+    parser.add_argument("--shows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep the existing data instead of regenerating")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--page-cache", action="store_true",
+                        help="leave the rendered page cache enabled")
+    parser.add_argument(
+        "--baseline", default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "baseline.json"))
+    parser.add_argument("--update", action="store_true",
+                        help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown/growth (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore latency changes smaller than this")
+    parser.add_argument("--only", action="append",
+                        help="benchmark only this route (repeatable)")
+    args = parser.parse_args()
+
+    overrides = {
+        "SQLALCHEMY_DATABASE_URI": args.database_url,
+        "DATABASE_REPLICA_URIS": [],
+        "WTF_CSRF_ENABLED": False,
+    }
+    if not args.page_cache:
+        overrides["PAGE_CACHE_SIZE"] = 0
+    app = create_app(overrides)
+    # The per-request SQL log line would dominate the output.
+    app.logger.setLevel(logging.ERROR)
+    meta = {
+        "database": args.database_url.split(":", 1)[0],
+        "venues": args.venues,
+        "artists": args.artists,
+        "shows": args.shows,
+        "seed": args.seed,
+        "page_cache": args.page_cache,
+    }
+
+    with app.app_context():
+        engine = db.engine
+        if not args.reuse:
+            print("generating data...")
+            datagen.seed(engine, args.venues, args.artists, args.shows,
+                         seed=args.seed)
+        counter = [0]
+
+        def count(*_):
+            counter[0] += 1
+        event.listen(engine, "before_cursor_execute", count)
+
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    results = {}
+    for name, method, make_kwargs in routes(args):
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(client, method, make_kwargs, rng,
+                                args.requests, args.warmup, counter)
+
+    recorded = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            recorded = json.load(f)
+        if recorded["meta"] != meta:
+            if not args.update:
+                sys.exit("baseline {} was recorded with {}; rerun with the "
+                         "same options or pass --update".format(
+                             args.baseline, recorded["meta"]))
+            recorded = None
+    baseline = recorded["routes"] if recorded and not args.update else {}
+    regressions = compare(baseline, results, args)
+
+    if args.update or recorded is None:
+        # --only updates just the routes it ran.
+        routes_ = dict(recorded["routes"] if recorded else {}, **results)
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": meta, "python": platform.python_version(),
+                       "routes": routes_}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baseline written to {}".format(args.baseline))
+    if regressions:
+        print("regressions:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
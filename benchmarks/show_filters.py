@@ -0,0 +1,144 @@
+# ----------------------------------------------------------------------------#
+# Show filter benchmark.
+# ----------------------------------------------------------------------------#
+# Seeds a large database (see datagen.py) and times the statement behind a
+# first page of /shows for each filter combination, printing its query
+# plan, first without and then with ix_Show_datetime and
+# ix_Venue_state_city. The composite (venue_id, datetime) index stays in
+# place throughout.
+#
+#   python benchmarks/show_filters.py --shows 2000000
+#   python benchmarks/show_filters.py --database-url postgresql://...
+#
+# The target database is dropped and recreated (unless --reuse is given),
+# so never point it at real data.
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Artist, Show, Venue, create_app, db, filter_shows  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+INDEXES = ("ix_Show_datetime", "ix_Venue_state_city")
+
+
+def cases(rng, num_venues):
+    # (name, filters factory); each call picks a new window or place.
+    def window(days):
+        start = datetime.date.today() + datetime.timedelta(
+            days=rng.randint(-365, 365))
+        return {"from": start.isoformat(),
+                "to": (start + datetime.timedelta(days=days)).isoformat()}
+
+    def place():
+        city, state = rng.choice(datagen.CITIES)
+        return {"city": city, "state": state}
+    return [
+        ("weekend", lambda: window(2)),
+        ("month", lambda: window(30)),
+        ("state", lambda: dict(window(2), state=place()["state"])),
+        ("city weekend", lambda: dict(window(2), **place())),
+        ("city", place),
+        ("venue month", lambda: dict(
+            window(30), venue_id=str(rng.randint(1, num_venues)))),
+    ]
+
+
+def statement(filters, per_page):
+    query = filter_shows(
+        Show.query.options(db.joinedload(Show.artist)), filters)
+    return query.order_by(Show.datetime, Show.id).limit(per_page + 1)
+
+
+def explain(query):
+    conn = db.session.connection()
+    compiled = query.statement.compile(dialect=conn.dialect)
+    if conn.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql(prefix + str(compiled), params).all()
+    return "\n".join("    " + str(row[-1]) for row in rows)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    results = {}
+    for name, make_filters in cases(rng, args.venues):
+        print("  {}:".format(name))
+        print(explain(statement(make_filters(), args.per_page)))
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            statement(make_filters(), args.per_page).all()
+        elapsed = time.perf_counter() - start
+        db.session.rollback()
+        results[name] = elapsed * 1000 / args.iterations
+        print("    {:.3f} ms/page".format(results[name]))
+    return results
+
+
+def analyze(engine):
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT") \
+                .exec_driver_sql('ANALYZE "Show"; ANALYZE "Venue"')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the filtered /shows query with and without its "
+                    "supporting indexes.")
+    parser.add_argument(
+        "--database-url", default="sqlite:///show_filters_bench.db")
+    parser.add_argument("--venues", type=int, default=5000)
+    parser.add_argument("--artists", type=int, default=50000)
+    parser.add_argument("--shows", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep the existing data instead of regenerating")
+    parser.add_argument("--per-page", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": args.database_url,
+        "DATABASE_REPLICA_URIS": [],
+    })
+    with app.app_context():
+        engine = db.engine
+        if not args.reuse:
+            print("seeding {} shows...".format(args.shows))
+            datagen.seed(engine, args.venues, args.artists, args.shows,
+                         seed=args.seed)
+        indexes = [index for model in (Show, Venue, Artist)
+                   for index in model.__table__.indexes
+                   if index.name in INDEXES]
+        for index in indexes:
+            index.drop(engine)
+        analyze(engine)
+        print("without {}".format(", ".join(INDEXES)))
+        before = run(args)
+        for index in indexes:
+            index.create(engine)
+        analyze(engine)
+        print("with {}".format(", ".join(INDEXES)))
+        after = run(args)
+
+    print("summary (ms/page)")
+    for name in before:
+        print("  {:<14} {:>10.3f} {:>10.3f} {:>8.1f}x".format(
+            name, before[name], after[name],
+            before[name] / after[name] if after[name] else float("inf")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------#
+# Show index benchmark.
+# ----------------------------------------------------------------------------#
+# Seeds a large database (see datagen.py) and compares the query plans and
+# timings of the past/upcoming lookups that the venue and artist pages run,
+# first without and then with the composite (venue_id, datetime) /
+# (artist_id, datetime) indexes.
+#
+#   python benchmarks/show_indexes.py --shows 1000000
+#   python benchmarks/show_indexes.py --database-url postgresql://...
+#
+# The target database is dropped and recreated, so never point it at real
+# data.
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Show  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+
+COMPOSITE = ("ix_Show_venue_id_datetime", "ix_Show_artist_id_datetime")
+
+
+def lookups(now):
+    show = Show.__table__
+    for column in (show.c.venue_id, show.c.artist_id):
+        for label, op in (("upcoming", show.c.datetime > now),
+                          ("past", show.c.datetime < now)):
+            yield "{} {}".format(column.name, label), column, sa.select(
+                show.c.id, show.c.venue_id, show.c.artist_id,
+                show.c.datetime).where(column == sa.bindparam("id"), op)
+
+
+def explain(conn, statement, params):
+    compiled = statement.compile(dialect=conn.dialect)
+    if conn.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    params = compiled.construct_params(params)
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql(prefix + str(compiled), params).all()
+    return "\n".join("    " + str(row[-1]) for row in rows)
+
+
+def run(engine, num_ids, iterations):
+    now = datetime.datetime.now()
+    rng = random.Random(1)
+    results = {}
+    with engine.connect() as conn:
+        for name, column, statement in lookups(now):
+            max_id = conn.execute(sa.select(sa.func.max(column))).scalar()
+            ids = [rng.randint(1, max_id) for _ in range(num_ids)]
+            print("  {}:".format(name))
+            print(explain(conn, statement, {"id": ids[0]}))
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for id in ids:
+                    conn.execute(statement, {"id": id}).all()
+            elapsed = time.perf_counter() - start
+            results[name] = elapsed * 1000 / (iterations * len(ids))
+            print("    {:.3f} ms/query".format(results[name]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare Show lookups with and without the composite "
+                    "(fk, datetime) indexes.")
+    parser.add_argument(
+        "--database-url", default="sqlite:///show_indexes_bench.db")
+    parser.add_argument("--venues", type=int, default=2000)
+    parser.add_argument("--artists", type=int, default=20000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ids", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    print("seeding {} shows...".format(args.shows))
+    datagen.seed(engine, args.venues, args.artists, args.shows,
+                 seed=args.seed)
+    indexes = [index for index in Show.__table__.indexes
+               if index.name in COMPOSITE]
+    for index in indexes:
+        index.drop(engine)
+
+    print("without composite indexes")
+    before = run(engine, args.ids, args.iterations)
+    for index in indexes:
+        index.create(engine)
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT") \
+                .exec_driver_sql('ANALYZE "Show"')
+    print("with composite indexes")
+    after = run(engine, args.ids, args.iterations)
+
+    print("summary (ms/query)")
+    for name in before:
+        print("  {:<20} {:>10.3f} {:>10.3f} {:>8.1f}x".format(
+            name, before[name], after[name],
+            before[name] / after[name] if after[name] else float("inf")))
+
+
+if __name__ == "__main__":
+    main()
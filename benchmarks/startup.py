@@ -0,0 +1,167 @@
+# ----------------------------------------------------------------------------#
+# Startup benchmark.
+# ----------------------------------------------------------------------------#
+# Measures what a preforking server pays per process:
+#
+#   cold     time to import app.py, build the app with create_app() and
+#            answer the first request, plus the process's peak RSS, each in
+#            a fresh interpreter (median of --runs).
+#   workers  per-worker memory and time-to-first-response for --workers
+#            forked workers, once with the app built in the master before
+#            forking (gunicorn --preload) and once with every worker
+#            building its own. Memory is read from /proc/self/smaps_rollup
+#            (Linux): USS is what a worker does not share with anyone, PSS
+#            its fair share of the shared pages.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --runs 20 --workers 8
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({{"SQLALCHEMY_DATABASE_URI": "sqlite://"}})
+created = time.perf_counter()
+application.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - start) * 1000,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+
+def cold(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD.format(root=ROOT)], cwd=ROOT,
+            check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return dict((key, round(statistics.median(s[key] for s in samples), 1))
+                for key in samples[0])
+
+
+def memory():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_kb": fields["Rss"],
+        "pss_kb": fields["Pss"],
+        "uss_kb": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def build(database_url):
+    from app import create_app
+    return create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+
+
+def serve(application, requests):
+    client = application.test_client()
+    for _ in range(requests):
+        for path in ("/", "/venues", "/artists", "/shows"):
+            client.get(path)
+
+
+def workers(preload, count, requests, database_url):
+    # Runs in its own interpreter (see main) so the two modes do not share
+    # imports.
+    application = None
+    if preload:
+        application = build(database_url)
+        serve(application, 1)
+    pipes = []
+    for _ in range(count):
+        read, write = os.pipe()
+        forked = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            worker_app = application or build(database_url)
+            serve(worker_app, 1)
+            ready = (time.perf_counter() - forked) * 1000
+            serve(worker_app, requests)
+            result = dict(memory(), ready_ms=ready)
+            os.write(write, json.dumps(result).encode())
+            os._exit(0)
+        os.close(write)
+        pipes.append((pid, read))
+    results = []
+    for pid, read in pipes:
+        with os.fdopen(read) as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return dict((key, round(statistics.mean(r[key] for r in results), 1))
+                for key in results[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure cold start and per-worker memory.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20,
+                        help="requests per worker before measuring memory")
+    parser.add_argument("--mode", choices=["preload", "per-worker"],
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--database-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(workers(args.mode == "preload", args.workers,
+                                 args.requests, args.database_url)))
+        return
+
+    print("cold start (median of {} runs)".format(args.runs))
+    for key, value in cold(args.runs).items():
+        print("  {:<18} {:>10.1f}".format(key, value))
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("per-worker memory needs /proc/self/smaps_rollup; skipped")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = "sqlite:///" + os.path.join(tmp, "startup.db")
+        from benchmarks import datagen
+        import sqlalchemy as sa
+        datagen.seed(sa.create_engine(database_url), 100, 500, 2000,
+                     echo=lambda message: None)
+        print("{} workers, mean per worker".format(args.workers))
+        print("  {:<12} {:>10} {:>10} {:>10} {:>10}".format(
+            "mode", "uss KiB", "pss KiB", "rss KiB", "ready ms"))
+        for mode in ("per-worker", "preload"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode,
+                 "--workers", str(args.workers),
+                 "--requests", str(args.requests),
+                 "--database-url", database_url],
+                cwd=ROOT, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print("  {:<12} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                mode, result["uss_kb"], result["pss_kb"], result["rss_kb"],
+                result["ready_ms"]))
+
+
+if __name__ == "__main__":
+    main()
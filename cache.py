@@ -0,0 +1,61 @@
+import collections
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+# ----------------------------------------------------------------------------#
+# A per-process LRU of rendered pages. Entries are dropped explicitly by the
+# write paths that change what a page shows, and expire after `ttl` seconds
+# regardless, because the past/upcoming split on the detail pages moves with
+# the clock even when nothing is written.
+
+
+class PageCache(object):
+
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config["PAGE_CACHE_SIZE"]
+        self.ttl = app.config["PAGE_CACHE_TTL"]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,6 +1,8 @@
 import os
 
-SECRET_KEY = os.urandom(32)
+# Must be the same in every worker and across restarts, or sessions signed by
+# one process fail to verify in another. Required unless DEBUG is on.
+SECRET_KEY = os.getenv("SECRET_KEY")
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -18,3 +20,92 @@ database_name = os.getenv("DATABASE_NAME", "fyyur")
 SQLALCHEMY_DATABASE_URI = "postgresql+psycopg2://{}:{}@{}/{}".format(
     database_user, database_password, database_address, database_name
 )
+
+# Number of show tiles rendered per /shows page.
+SHOWS_PER_PAGE = int(os.getenv("SHOWS_PER_PAGE", 30))
+
+# Default and maximum page sizes for the paginated listing and search views.
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+
+# Search result counts are exact up to this many matches and estimated
+# beyond it.
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", 1000))
+
+# Rendered venue and artist pages are cached per process. Writes invalidate
+# them; the TTL (seconds) bounds how stale the past/upcoming split can get.
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 1024))
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 60))
+
+# Number of formatted show times memoized by the `datetime` template filter.
+DATETIME_FORMAT_CACHE_SIZE = int(os.getenv("DATETIME_FORMAT_CACHE_SIZE", 4096))
+
+# Streamed listings (?stream=1): rows fetched per server-side cursor batch,
+# and template events buffered per chunk sent to the client.
+STREAM_YIELD_PER = int(os.getenv("STREAM_YIELD_PER", 1000))
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", 50))
+
+# Connection pool for the database engine (ignored for SQLite). Timeouts and
+# recycle are in seconds, the statement timeout in milliseconds (0 disables
+# it; Postgres only, and applied only to connections serving web requests).
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))
+DATABASE_POOL_MAX_OVERFLOW = int(os.getenv("DATABASE_POOL_MAX_OVERFLOW", 10))
+DATABASE_POOL_TIMEOUT = int(os.getenv("DATABASE_POOL_TIMEOUT", 30))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", 1800))
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "1") == "1"
+DATABASE_STATEMENT_TIMEOUT = int(os.getenv("DATABASE_STATEMENT_TIMEOUT", 5000))
+
+# The /internal/ endpoints answer only requests carrying
+# "Authorization: Bearer <INTERNAL_TOKEN>", and are off while it is unset.
+# Behind a reverse proxy every client shares the proxy's address, so the
+# remote address alone is never trusted; INTERNAL_ALLOWED_ADDRS only lets
+# local requests through without the token in debug.
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+INTERNAL_ALLOWED_ADDRS = os.getenv(
+    "INTERNAL_ALLOWED_ADDRS", "127.0.0.1,::1").split(",")
+
+# Read replicas (comma-separated URIs). GET views read from them round-robin;
+# after a write the client reads from the primary for this many seconds.
+DATABASE_REPLICA_URIS = [
+    uri for uri in os.getenv("DATABASE_REPLICA_URIS", "").split(",") if uri]
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+# Per-request statement counts/timing (Server-Timing header and a log line).
+# A statement shape repeated this many times in one request is logged as a
+# likely N+1.
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "1") == "1"
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 5))
+
+# Rows per transaction (and per COPY on Postgres) for `flask import`.
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 5000))
+
+# Largest tour accepted by POST /api/v1/shows/batch.
+SHOW_BATCH_MAX = int(os.getenv("SHOW_BATCH_MAX", 500))
+
+# `flask archive-shows` moves shows that started more than
+# SHOW_ARCHIVE_DAYS ago into ShowArchive, SHOW_ARCHIVE_BATCH_SIZE rows per
+# transaction.
+SHOW_ARCHIVE_DAYS = int(os.getenv("SHOW_ARCHIVE_DAYS", 90))
+SHOW_ARCHIVE_BATCH_SIZE = int(os.getenv("SHOW_ARCHIVE_BATCH_SIZE", 5000))
+
+# Logging (used when DEBUG is off). Records go through a bounded queue to a
+# background writer; when it is full they are dropped and counted. Each
+# process writes its own files, with its pid inserted before the extension
+# (error.<pid>.log). Files rotate at LOG_MAX_BYTES, or on LOG_ROTATE_WHEN
+# (e.g. "midnight") if set.
+ERROR_LOG = os.getenv("ERROR_LOG", "error.log")
+ACCESS_LOG = os.getenv("ACCESS_LOG", "access.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Serve the fingerprinted files written by `flask build-assets`. Off in debug
+# so edits to static/ show up without a rebuild.
+USE_ASSET_MANIFEST = os.getenv(
+    "USE_ASSET_MANIFEST", "0" if DEBUG else "1") == "1"
+
+# In-process name index behind /api/v1/{venues,artists}/autocomplete. Rows
+# changed by other processes are picked up every TYPEAHEAD_REFRESH seconds.
+TYPEAHEAD_REFRESH = int(os.getenv("TYPEAHEAD_REFRESH", 30))
+TYPEAHEAD_LIMIT = int(os.getenv("TYPEAHEAD_LIMIT", 10))
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+import weakref
+
+from flask import has_request_context
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+# ----------------------------------------------------------------------------#
+# Connection pool.
+# ----------------------------------------------------------------------------#
+# The engine's QueuePool is sized from the DATABASE_POOL_* settings in
+# config.py and records how long each checkout waited for a connection, so
+# /internal/pool can tell an exhausted pool from a slow database.
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def recreate(self):
+        # Engine.dispose() swaps in a fresh pool; carry the counters over.
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.checkouts = self.checkouts
+        pool.timeouts = self.timeouts
+        pool.wait_total = self.wait_total
+        pool.wait_max = self.wait_max
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        except TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def status_dict(self):
+        with self._stats_lock:
+            checkouts = self.checkouts
+            wait_total = self.wait_total
+            wait_max = self.wait_max
+            timeouts = self.timeouts
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_total_ms": round(wait_total * 1000, 3),
+            "wait_avg_ms": round(
+                wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+            "wait_max_ms": round(wait_max * 1000, 3),
+        }
+
+
+def statement_timeout_on_checkout(timeout):
+    # Pool "checkout" listener that caps statements at `timeout` ms on
+    # connections handed out while serving a request. Migrations and the
+    # CLI commands share the engine but run outside any request, so their
+    # index builds and batch moves are not cancelled. The SET is committed
+    # so the reset-on-return rollback keeps it, and is sent once per
+    # connection.
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        if (not has_request_context() or
+                connection_record.info.get("statement_timeout")):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SET statement_timeout = {:d}".format(timeout))
+        finally:
+            cursor.close()
+        dbapi_connection.commit()
+        connection_record.info["statement_timeout"] = timeout
+    return checkout
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    # Applies the DATABASE_POOL_* and DATABASE_STATEMENT_TIMEOUT settings to
+    # server databases. SQLite keeps Flask-SQLAlchemy's own pool choice.
+
+    def __init__(self, app=None, **kwargs):
+        self._apps = weakref.WeakSet()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.dispose_after_fork)
+        super(PooledSQLAlchemy, self).__init__(app, **kwargs)
+
+    def init_app(self, app):
+        super(PooledSQLAlchemy, self).init_app(app)
+        self._apps.add(app)
+
+    def dispose_after_fork(self):
+        # A forked worker must not use the connections its parent opened
+        # (e.g. while building the app in a preloading master): both
+        # processes would talk over the same socket. close=False leaves them
+        # open for the parent; the child's pool starts empty.
+        for app in list(self._apps):
+            state = app.extensions.get("sqlalchemy")
+            for connector in state.connectors.values() if state else ():
+                if connector._engine is not None:
+                    connector._engine.dispose(close=False)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        self._statement_timeout = 0
+        if (sa_url.drivername == "sqlite" and
+                sa_url.database not in (None, "", ":memory:")):
+            # Flask-SQLAlchemy 2.4 makes file paths absolute by assigning to
+            # the URL, which is immutable in SQLAlchemy 1.4; create_engine()
+            # resolves the path instead. NullPool matches its default.
+            options.setdefault("poolclass", NullPool)
+            self._sqlite_root = app.root_path
+            return
+        super(PooledSQLAlchemy, self).apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith("sqlite"):
+            return
+        config = app.config
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config["DATABASE_POOL_SIZE"],
+            max_overflow=config["DATABASE_POOL_MAX_OVERFLOW"],
+            pool_timeout=config["DATABASE_POOL_TIMEOUT"],
+            pool_recycle=config["DATABASE_POOL_RECYCLE"],
+            pool_pre_ping=config["DATABASE_POOL_PRE_PING"],
+        )
+        timeout = config["DATABASE_STATEMENT_TIMEOUT"]
+        if timeout and sa_url.drivername.startswith("postgresql"):
+            self._statement_timeout = timeout
+
+    def create_engine(self, sa_url, engine_opts):
+        if (sa_url.drivername == "sqlite" and
+                sa_url.database not in (None, "", ":memory:") and
+                not os.path.isabs(sa_url.database)):
+            sa_url = sa_url.set(database=os.path.join(
+                self._sqlite_root, sa_url.database))
+        engine = super(PooledSQLAlchemy, self).create_engine(
+            sa_url, engine_opts)
+        if self._statement_timeout:
+            event.listen(engine, "checkout", statement_timeout_on_checkout(
+                self._statement_timeout))
+        return engine
@@ -0,0 +1,264 @@
+import collections
+import csv
+import datetime
+import io
+import json
+import time
+
+import sqlalchemy as sa
+
+from werkzeug.datastructures import MultiDict
+
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+# ----------------------------------------------------------------------------#
+# Streams CSV or JSONL rows, validates each one with the same WTForms form
+# the create views use, and writes accepted rows in chunks: one COPY per
+# table and chunk on Postgres, one executemany elsewhere. Rows that fail
+# validation or reference a missing venue/artist go to a JSONL reject file
+# with their line number and errors.
+
+# form: form class used for validation.
+# fields: {form field: model column} copied from the validated form.
+# genre_model/genre_key: join table that receives form.genres, if any.
+# booleans: form fields whose "False"/"no"/"0" spellings mean unchecked.
+# references: {model column: referenced model} checked before insert.
+ImportSpec = collections.namedtuple(
+    "ImportSpec",
+    "model form fields booleans genre_model genre_key references")
+
+FALSE_VALUES = frozenset(["", "0", "false", "f", "no", "n", "off"])
+
+
+def read_rows(path):
+    # Yields (line number, row dict or None for an unparseable line).
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_no, row if isinstance(row, dict) else None
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def to_formdata(row, spec):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == "genres" and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(",")]
+        if isinstance(value, bool):
+            value = "y" if value else "false"
+        elif (isinstance(value, str) and key in spec.booleans and
+                value.strip().lower() in FALSE_VALUES):
+            value = "false"
+        if isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def validate_row(spec, row):
+    # Returns (record, None) or (None, errors). Field defaults are for the
+    # blank create pages; here a missing field is missing, so each field
+    # starts out empty rather than at its default.
+    form = spec.form(formdata=to_formdata(row, spec), meta={"csrf": False},
+                     data=dict((name, None) for name in spec.fields))
+    if not form.validate():
+        return None, form.errors
+    values = dict(
+        (column, getattr(form, field).data)
+        for field, column in spec.fields.items())
+    errors = {}
+    for column in spec.references:
+        try:
+            values[column] = int(values[column])
+        except (TypeError, ValueError):
+            errors[column] = ["Not a valid id."]
+    if errors:
+        return None, errors
+    # A genre listed twice would break the join table's primary key.
+    genres = list(dict.fromkeys(form.genres.data)) \
+        if spec.genre_model is not None else []
+    return (values, genres), None
+
+
+def find_existing_ids(conn, references):
+    # {key: existing ids} for {key: (model, candidate ids)}, answered by a
+    # single statement: a UNION ALL of one IN query per referenced table.
+    found = dict((key, set()) for key in references)
+    selects = [
+        sa.select(sa.literal(key).label("key"), model.__table__.c.id)
+        .where(model.__table__.c.id.in_(sorted(ids)))
+        for key, (model, ids) in references.items() if ids]
+    if selects:
+        statement = sa.union_all(*selects) if len(selects) > 1 else selects[0]
+        for key, id in conn.execute(statement):
+            found[key].add(id)
+    return found
+
+
+def check_references(conn, spec, records):
+    # Errors for each record whose venue/artist ids do not exist, or None.
+    existing = find_existing_ids(conn, dict(
+        (column, (model, set(values[column] for values, _ in records)))
+        for column, model in spec.references.items()))
+    return [dict(
+        (column, ["No such id."]) for column in spec.references
+        if values[column] not in existing[column]) or None
+        for values, _ in records]
+
+
+def allocate_ids(conn, table, count):
+    # Ids are assigned up front so genre rows can reference their owner
+    # without a RETURNING round trip per row.
+    if conn.dialect.name == "postgresql":
+        return list(conn.exec_driver_sql(
+            "SELECT nextval(pg_get_serial_sequence(%(table)s, 'id')) "
+            "FROM generate_series(1, %(count)s)",
+            {"table": '"{}"'.format(table.name), "count": count}).scalars())
+    if (conn.dialect.name == "sqlite" and
+            not conn.connection.dbapi_connection.in_transaction):
+        # pysqlite only begins a transaction at the first write; take the
+        # write lock before reading max(id) so that a concurrent writer
+        # cannot pick the same ids.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    start = conn.execute(
+        table.select().with_only_columns(
+            table.c.id).order_by(table.c.id.desc()).limit(1)).scalar() or 0
+    return list(range(start + 1, start + 1 + count))
+
+
+def write_rows(conn, table, rows):
+    if not rows:
+        return
+    if conn.dialect.name != "postgresql":
+        conn.execute(table.insert(), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(
+            'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                table.name, ", ".join('"{}"'.format(c) for c in columns)),
+            buffer)
+
+
+def insert_chunk(conn, spec, records):
+    # Writes validated records and returns their new ids, in order.
+    table = spec.model.__table__
+    now = datetime.datetime.utcnow()
+    ids = allocate_ids(conn, table, len(records))
+    rows, genre_rows = [], []
+    for id, (values, genres) in zip(ids, records):
+        rows.append(dict(values, id=id, updated_at=now))
+        genre_rows.extend(
+            {spec.genre_key: id, "genre": genre} for genre in genres)
+    write_rows(conn, table, rows)
+    if spec.genre_model is not None:
+        write_rows(conn, spec.genre_model.__table__, genre_rows)
+    return ids
+
+
+class ImportReport(object):
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rows(self):
+        return self.accepted + self.rejected
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return "{} rows ({} imported, {} rejected), {:.0f} rows/s".format(
+            self.rows, self.accepted, self.rejected, self.rate())
+
+
+def run_import(engine, spec, paths, chunk_size, rejects, echo=print):
+    # `rejects` is a writable text file receiving one JSON object per
+    # rejected row.
+    report = ImportReport()
+
+    def reject(path, line_no, row, errors):
+        report.rejected += 1
+        rejects.write(json.dumps({
+            "file": path, "line": line_no, "row": row, "errors": errors},
+            default=str) + "\n")
+
+    # COPY raises the driver's own exception rather than SQLAlchemy's.
+    integrity_errors = (sa.exc.IntegrityError,
+                        engine.dialect.dbapi.IntegrityError)
+
+    def write(chunk):
+        # Returns how many rows of `chunk` were written. Rows with missing
+        # references are only rejected once the transaction committed, so
+        # a retry does not reject them twice.
+        with engine.begin() as conn:
+            accepted, rejected = [], []
+            errors = check_references(
+                conn, spec, [record for _, _, _, record in chunk])
+            for (path, line_no, row, record), error in zip(chunk, errors):
+                if error:
+                    rejected.append((path, line_no, row, error))
+                else:
+                    accepted.append(record)
+            if accepted:
+                insert_chunk(conn, spec, accepted)
+        for args in rejected:
+            reject(*args)
+        return len(accepted)
+
+    def flush(chunk):
+        if not chunk:
+            return
+        try:
+            report.accepted += write(chunk)
+        except integrity_errors:
+            # Something in the chunk violates a constraint the forms do not
+            # check; the chunk was rolled back, so retry it row by row to
+            # keep the good rows and reject only the offending ones.
+            for path, line_no, row, record in chunk:
+                try:
+                    report.accepted += write([(path, line_no, row, record)])
+                except integrity_errors as error:
+                    reject(path, line_no, row, {
+                        "row": [str(getattr(error, "orig", error)).strip()]})
+        echo(str(report))
+
+    for path in paths:
+        chunk = []
+        for line_no, row in read_rows(path):
+            if row is None:
+                reject(path, line_no, None, {"row": ["Unparseable line."]})
+                continue
+            record, errors = validate_row(spec, row)
+            if errors:
+                reject(path, line_no, row, errors)
+                continue
+            chunk.append((path, line_no, row, record))
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        flush(chunk)
+    return report
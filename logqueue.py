@@ -0,0 +1,190 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler)
+
+from flask import g, request
+from flask.logging import default_handler
+
+
+# ----------------------------------------------------------------------------#
+# Logging pipeline.
+# ----------------------------------------------------------------------------#
+# Request threads only put records on a bounded in-memory queue; a listener
+# thread formats them as JSON and writes them to the rotating error and
+# access logs. When the queue is full the record is dropped and counted
+# rather than blocking the request, so a slow disk never shows up as
+# request latency. /internal/logging reports the queue depth and drops.
+#
+# Rotating handlers in separate processes would each rotate the same file
+# on their own and lose records, so every process writes its own files,
+# named with its pid (error.log becomes error.<pid>.log).
+
+
+class DroppingQueueHandler(QueueHandler):
+
+    def __init__(self, maxsize):
+        super(DroppingQueueHandler, self).__init__(queue.Queue(maxsize))
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keeps the traceback apart from the
+        # message so the JSON formatter can emit it as its own field.
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def process_log_path(path):
+    stem, ext = os.path.splitext(path)
+    return "{}.{:d}{}".format(stem, os.getpid(), ext)
+
+
+def rotating_handler(path, max_bytes, backup_count, when):
+    # Time-based rotation when `when` is set (e.g. "midnight"), otherwise
+    # size-based.
+    path = process_log_path(path)
+    if when:
+        return TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, delay=True)
+    return RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+
+
+class LogPipeline(object):
+
+    def __init__(self, app=None):
+        self.handler = None
+        self.listener = None
+        self._file_handlers = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        formatter = JSONFormatter()
+        self.access_logger = logging.getLogger(app.logger.name + ".access")
+        access_name = self.access_logger.name
+
+        def file_handlers():
+            # Opened lazily (delay=True), so a preloading master that never
+            # logs leaves no files behind.
+            handlers = []
+            for path, wanted in ((config["ERROR_LOG"], False),
+                                 (config["ACCESS_LOG"], True)):
+                handler = rotating_handler(
+                    path, config["LOG_MAX_BYTES"],
+                    config["LOG_BACKUP_COUNT"], config["LOG_ROTATE_WHEN"])
+                handler.setFormatter(formatter)
+                handler.addFilter(
+                    lambda record, wanted=wanted:
+                        (record.name == access_name) == wanted)
+                handlers.append(handler)
+            return handlers
+        self._file_handlers = file_handlers
+
+        self.handler = DroppingQueueHandler(config["LOG_QUEUE_SIZE"])
+        self.handler.setFormatter(formatter)
+        app.logger.setLevel(logging.INFO)
+        # Flask's stderr handler would write synchronously as well.
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.handler)
+        self.access_logger.setLevel(logging.INFO)
+
+        self.listener = QueueListener(
+            self.handler.queue, *file_handlers(), respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+        app.before_request(self._start)
+        app.after_request(self._log_access)
+        app.extensions["log_pipeline"] = self
+
+    def stop(self):
+        # Flushes whatever is still queued and ends the listener thread.
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def _restart_after_fork(self):
+        # Threads do not survive fork(), and the queue may have been locked
+        # by the parent's listener; give the child its own of both, writing
+        # to files named with the child's pid.
+        if self.listener is None:
+            return
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self.handler.dropped = 0
+        self.listener = QueueListener(
+            self.handler.queue, *self._file_handlers(),
+            respect_handler_level=True)
+        self.listener.start()
+
+    def status_dict(self):
+        if self.handler is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "queued": self.handler.queue.qsize(),
+            "capacity": self.handler.queue.maxsize,
+            "dropped": self.handler.dropped,
+        }
+
+    def _start(self):
+        g.request_started = time.perf_counter()
+
+    def _log_access(self, response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        fields = {
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "remote_addr": request.remote_addr,
+        }
+        stats = g.get("sql_stats")
+        if stats is not None:
+            fields["db_ms"] = round(stats.db_time * 1000, 3)
+            fields["queries"] = stats.queries
+        self.access_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={"fields": fields})
+        return response
@@ -0,0 +1,66 @@
+"""index Venue and Artist names for substring search
+
+Revision ID: 4d1a6c2b7e90
+Revises: e39b030ada5a
+Create Date: 2026-10-18 10:12:41.531207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d1a6c2b7e90'
+down_revision = 'e39b030ada5a'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for t in TABLES:
+            op.execute(
+                'CREATE INDEX IF NOT EXISTS "ix_{t}_name_trgm" ON "{t}" '
+                'USING gin (name gin_trgm_ops)'.format(t=t))
+    elif dialect == 'sqlite':
+        for t in TABLES:
+            fts = '{}_name_fts'.format(t)
+            op.execute(
+                'CREATE VIRTUAL TABLE "{fts}" USING fts5(name, '
+                'content="{t}", content_rowid="id", tokenize="trigram")'
+                .format(fts=fts, t=t))
+            op.execute(
+                'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{t}" BEGIN '
+                'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); '
+                'END'.format(fts=fts, t=t))
+            op.execute(
+                'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{t}" BEGIN '
+                'INSERT INTO "{fts}"("{fts}", rowid, name) '
+                "VALUES ('delete', old.id, old.name); END"
+                .format(fts=fts, t=t))
+            op.execute(
+                'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF name ON "{t}" '
+                'BEGIN INSERT INTO "{fts}"("{fts}", rowid, name) '
+                "VALUES ('delete', old.id, old.name); "
+                'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); '
+                'END'.format(fts=fts, t=t))
+            op.execute(
+                "INSERT INTO \"{fts}\"(\"{fts}\") VALUES ('rebuild')"
+                .format(fts=fts))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for t in TABLES:
+            op.execute('DROP INDEX IF EXISTS "ix_{}_name_trgm"'.format(t))
+    elif dialect == 'sqlite':
+        for t in TABLES:
+            fts = '{}_name_fts'.format(t)
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS "{}_{}"'.format(fts, suffix))
+            op.execute('DROP TABLE IF EXISTS "{}"'.format(fts))
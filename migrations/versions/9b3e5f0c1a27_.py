@@ -0,0 +1,42 @@
+"""add composite (fk, datetime) indexes on Show
+
+Revision ID: 9b3e5f0c1a27
+Revises: 4d1a6c2b7e90
+Create Date: 2026-10-18 11:03:09.214856
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5f0c1a27'
+down_revision = '4d1a6c2b7e90'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_Show_venue_id_datetime', ['venue_id', 'datetime'], ['artist_id']),
+    ('ix_Show_artist_id_datetime', ['artist_id', 'datetime'], ['venue_id']),
+)
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, so on
+    # Postgres the indexes are built in an autocommit block without taking
+    # a write lock on Show.
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, columns, include in INDEXES:
+            op.create_index(
+                name, 'Show', columns,
+                postgresql_include=include,
+                postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, columns, include in INDEXES:
+            op.drop_index(
+                name, table_name='Show',
+                postgresql_concurrently=concurrently)
@@ -0,0 +1,45 @@
+"""add ShowArchive for shows moved out of Show
+
+Revision ID: a83e61c5d2f7
+Revises: f2c7a9d41b58
+Create Date: 2026-10-18 16:27:05.318840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83e61c5d2f7'
+down_revision = 'f2c7a9d41b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowArchive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('datetime', sa.DateTime(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ShowArchive_venue_id_datetime', 'ShowArchive',
+                    ['venue_id', 'datetime'],
+                    postgresql_include=['artist_id'])
+    op.create_index('ix_ShowArchive_artist_id_datetime', 'ShowArchive',
+                    ['artist_id', 'datetime'],
+                    postgresql_include=['venue_id'])
+    op.create_index('ix_ShowArchive_datetime', 'ShowArchive', ['datetime'])
+
+
+def downgrade():
+    op.drop_index('ix_ShowArchive_datetime', table_name='ShowArchive')
+    op.drop_index('ix_ShowArchive_artist_id_datetime',
+                  table_name='ShowArchive')
+    op.drop_index('ix_ShowArchive_venue_id_datetime',
+                  table_name='ShowArchive')
+    op.drop_table('ShowArchive')
@@ -0,0 +1,72 @@
+"""move Venue and Artist genres into join tables
+
+Revision ID: b7f2d4e81c03
+Revises: 9b3e5f0c1a27
+Create Date: 2026-10-18 11:48:52.660137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f2d4e81c03'
+down_revision = '9b3e5f0c1a27'
+branch_labels = None
+depends_on = None
+
+OWNERS = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def upgrade():
+    conn = op.get_bind()
+    for owner, fk in OWNERS:
+        link = '{}Genre'.format(owner)
+        op.create_table(link,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre', sa.String(length=120), nullable=False),
+        sa.ForeignKeyConstraint([fk], ['{}.id'.format(owner)],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(fk, 'genre')
+        )
+        op.create_index('ix_{}_genre_{}'.format(link, fk), link, ['genre', fk])
+
+        # Backfill from the comma-joined strings.
+        owners = sa.table(owner, sa.column('id'), sa.column('genres'))
+        links = sa.table(link, sa.column(fk), sa.column('genre'))
+        rows = []
+        for id, genres in conn.execute(
+                sa.select(owners.c.id, owners.c.genres)):
+            names = {g.strip() for g in (genres or '').split(',')}
+            rows.extend({fk: id, 'genre': g} for g in sorted(names) if g)
+        if rows:
+            op.bulk_insert(links, rows)
+
+        if conn.dialect.name == 'sqlite':
+            # Batch mode would rebuild the table and lose the search
+            # triggers on it; SQLite 3.35+ can drop the column in place.
+            op.execute('ALTER TABLE "{}" DROP COLUMN genres'.format(owner))
+        else:
+            op.drop_column(owner, 'genres')
+
+
+def downgrade():
+    conn = op.get_bind()
+    for owner, fk in OWNERS:
+        link = '{}Genre'.format(owner)
+        op.add_column(
+            owner, sa.Column('genres', sa.String(length=120), nullable=True))
+
+        owners = sa.table(owner, sa.column('id'), sa.column('genres'))
+        links = sa.table(link, sa.column(fk), sa.column('genre'))
+        joined = {}
+        for id, genre in conn.execute(
+                sa.select(links.c[fk], links.c.genre)
+                .order_by(links.c[fk], links.c.genre)):
+            joined.setdefault(id, []).append(genre)
+        for id, genres in joined.items():
+            conn.execute(owners.update().where(owners.c.id == id)
+                         .values(genres=','.join(genres)))
+
+        op.drop_index('ix_{}_genre_{}'.format(link, fk), table_name=link)
+        op.drop_table(link)
@@ -0,0 +1,63 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: d5a8c3f19e64
+Revises: b7f2d4e81c03
+Create Date: 2026-10-18 13:20:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c3f19e64'
+down_revision = 'b7f2d4e81c03'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # Existing rows count as modified at migration time. A constant server
+    # default fills them without rewriting the tables on Postgres 11+,
+    # instead of one UPDATE over every row; it is then dropped, since the
+    # models set updated_at themselves. SQLite can't drop a default in
+    # place (a batch rebuild would lose the search triggers), so it stays.
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    for t in TABLES:
+        op.add_column(t, sa.Column(
+            'updated_at', sa.DateTime(), nullable=True,
+            server_default=sa.text("'{}'".format(now.isoformat(' ')))))
+        if dialect != 'sqlite':
+            op.alter_column(t, 'updated_at', server_default=None)
+    # Built concurrently on Postgres, see 9b3e5f0c1a27.
+    concurrently = dialect == 'postgresql'
+    with op.get_context().autocommit_block():
+        for t in TABLES:
+            op.create_index(
+                'ix_{}_updated_at'.format(t), t, ['updated_at'],
+                postgresql_concurrently=concurrently)
+        op.create_index(
+            'ix_Show_datetime', 'Show', ['datetime'],
+            postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    concurrently = dialect == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_Show_datetime', table_name='Show',
+            postgresql_concurrently=concurrently)
+        for t in reversed(TABLES):
+            op.drop_index(
+                'ix_{}_updated_at'.format(t), table_name=t,
+                postgresql_concurrently=concurrently)
+    for t in reversed(TABLES):
+        if dialect == 'sqlite':
+            op.execute('ALTER TABLE "{}" DROP COLUMN updated_at'.format(t))
+        else:
+            op.drop_column(t, 'updated_at')
@@ -0,0 +1,33 @@
+"""add (state, city) index on Venue for the /shows filters
+
+Revision ID: f2c7a9d41b58
+Revises: d5a8c3f19e64
+Create Date: 2026-10-18 15:41:27.603318
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a9d41b58'
+down_revision = 'd5a8c3f19e64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently on Postgres, see 9b3e5f0c1a27. The range on
+    # Show.datetime is served by ix_Show_datetime from d5a8c3f19e64.
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_Venue_state_city', 'Venue', ['state', 'city'],
+            postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_Venue_state_city', table_name='Venue',
+            postgresql_concurrently=concurrently)
@@ -0,0 +1,124 @@
+import base64
+import datetime
+import json
+
+from sqlalchemy import and_, func, or_
+
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+# ----------------------------------------------------------------------------#
+# Pages are addressed by an opaque cursor holding the sort key of the last
+# row that was shown, so fetching page N costs the same as fetching page 1
+# (no OFFSET scan over the rows that came before it).
+
+
+def encode_cursor(values):
+    payload = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, columns):
+    # Raises ValueError for anything that was not produced by encode_cursor
+    # for the same key columns.
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (TypeError, UnicodeError, json.JSONDecodeError,
+            base64.binascii.Error) as e:
+        raise ValueError("malformed cursor") from e
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("malformed cursor")
+    decoded = []
+    for column, value in zip(columns, values):
+        # Every value must have its column's type, so nothing but a plain
+        # scalar ever reaches the comparison. NULL has no place in the
+        # "greater than" walk, so keyset columns must never be NULL.
+        expected = column.type.python_type
+        if value is None:
+            raise ValueError("malformed cursor")
+        if expected is datetime.datetime:
+            if not isinstance(value, str):
+                raise ValueError("malformed cursor")
+            value = datetime.datetime.fromisoformat(value)
+        elif type(value) is not expected:
+            raise ValueError("malformed cursor")
+        decoded.append(value)
+    return decoded
+
+
+def _after(columns, values):
+    # Lexicographic "(c1, c2, ...) > (v1, v2, ...)" spelled out with AND/OR
+    # so it can use the composite sort index on every backend.
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal_prefix, column > value))
+    return or_(*clauses)
+
+
+def _sort_value(row, column):
+    # Rows are either mapped instances or result tuples that lead with one.
+    if hasattr(row, column.key):
+        return getattr(row, column.key)
+    return getattr(row[0], column.key)
+
+
+def keyset_page(query, columns, cursor, per_page):
+    # Returns (items, next_cursor). next_cursor is None on the last page.
+    # `columns` must not yield NULL; coalesce a nullable column first.
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            [_sort_value(last, column) for column in columns])
+    return items, next_cursor
+
+
+def page_size(requested, default, maximum):
+    # Clamps a client supplied page size to [1, maximum].
+    try:
+        size = int(requested)
+    except (TypeError, ValueError):
+        return min(default, maximum)
+    return max(1, min(size, maximum))
+
+
+# ----------------------------------------------------------------------------#
+# Count estimates.
+# ----------------------------------------------------------------------------#
+
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATE = "estimate"
+COUNT_LOWER_BOUND = "lower_bound"
+
+
+def estimate_count(query, threshold):
+    # Returns (count, kind), kind being one of the COUNT_* values above.
+    # Below `threshold` matches the count is exact and only reads that many
+    # rows. Past it a full COUNT(*) would scan the whole match set, so
+    # Postgres answers from the planner's row estimate and other backends
+    # only report that there are more than `threshold`.
+    query = query.order_by(None)
+    bounded = query.limit(threshold + 1).subquery()
+    count = query.session.query(func.count()).select_from(bounded).scalar()
+    if count <= threshold:
+        return count, COUNT_EXACT
+    connection = query.session.connection()
+    if connection.dialect.name == "postgresql":
+        compiled = query.statement.compile(dialect=connection.dialect)
+        plan = connection.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + str(compiled),
+            compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]["Plan"]["Plan Rows"]), count), COUNT_ESTIMATE
+    return threshold, COUNT_LOWER_BOUND
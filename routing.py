@@ -0,0 +1,109 @@
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+
+from dbpool import PooledSQLAlchemy
+
+
+# ----------------------------------------------------------------------------#
+# Read-replica routing.
+# ----------------------------------------------------------------------------#
+# Each DATABASE_REPLICA_URIS entry becomes a "replica<N>" bind. GET and HEAD
+# requests, and views marked @read_only (such as the search forms, which
+# POST), read from one replica, picked round-robin per request; everything
+# else, and anything that flushes or executes DML, goes to the primary.
+# After a request that committed a transaction the client is pinned to the
+# primary for READ_YOUR_WRITES_SECONDS, so the page it is redirected to
+# shows its own change even if the replicas lag.
+
+READ_METHODS = frozenset(["GET", "HEAD"])
+PRIMARY_UNTIL = "db_primary_until"
+
+
+def read_only(view):
+    # Lets a view that only reads be served from a replica whatever its
+    # HTTP method.
+    view.read_only = True
+    return view
+
+
+def replica_binds(uris):
+    return dict(
+        ("replica{}".format(i), uri) for i, uri in enumerate(uris) if uri)
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        self._replica = None
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (self._flushing or isinstance(clause, UpdateBase) or
+                not has_request_context() or
+                not g.get("read_from_replica", False)):
+            return super(RoutingSession, self).get_bind(mapper, clause)
+        # One replica per session, i.e. per request, so every read in a
+        # request sees the same snapshot.
+        if self._replica is None:
+            self._replica = self.db.get_engine(
+                self.app, bind=self.db.next_replica())
+        return self._replica
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_written(session):
+    if has_request_context():
+        g.db_committed = True
+
+
+class RoutingSQLAlchemy(PooledSQLAlchemy):
+
+    def __init__(self, app=None, **kwargs):
+        self._replica_lock = threading.Lock()
+        self._replicas = None
+        super(RoutingSQLAlchemy, self).__init__(app, **kwargs)
+
+    def init_app(self, app):
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", None) or {}
+        binds.update(replica_binds(app.config["DATABASE_REPLICA_URIS"]))
+        app.config["SQLALCHEMY_BINDS"] = binds or None
+        super(RoutingSQLAlchemy, self).init_app(app)
+        app.before_request(self._route_request)
+        app.after_request(self._pin_writer)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def replica_keys(self):
+        binds = self.get_app().config["SQLALCHEMY_BINDS"] or {}
+        return sorted(key for key in binds if key.startswith("replica"))
+
+    def next_replica(self):
+        with self._replica_lock:
+            if self._replicas is None:
+                self._replicas = itertools.cycle(self.replica_keys())
+            return next(self._replicas)
+
+    def _route_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        g.read_from_replica = (
+            (request.method in READ_METHODS or
+             getattr(view, "read_only", False)) and
+            bool(self.replica_keys()) and
+            session.get(PRIMARY_UNTIL, 0) < time.time())
+
+    def _pin_writer(self, response):
+        app = self.get_app()
+        seconds = app.config["READ_YOUR_WRITES_SECONDS"]
+        if (seconds and self.replica_keys() and
+                g.get("db_committed", False) and
+                response.status_code < 400):
+            session[PRIMARY_UNTIL] = time.time() + seconds
+        return response
@@ -0,0 +1,109 @@
+from sqlalchemy import (
+    DDL, Float, case, cast, column, event, func, select, table)
+
+
+# ----------------------------------------------------------------------------#
+# Name search.
+# ----------------------------------------------------------------------------#
+# Case-insensitive substring search on the `name` column of Venue and Artist
+# backed by an index instead of a sequential ILIKE '%term%' scan:
+#
+# * Postgres: a pg_trgm GIN index, which ILIKE '%term%' can use directly.
+#   Results are ranked by trigram similarity.
+# * SQLite: an external-content FTS5 table with the trigram tokenizer, kept
+#   in sync with triggers. Results are ranked exact match, then prefix
+#   match, then any other substring match.
+#
+# The DDL below is attached to the tables so `db.create_all()` builds it;
+# databases managed by Alembic get it from the 4d1a6c2b7e90 migration.
+
+# The trigram tokenizer can only use its index for terms of at least this
+# many characters; shorter terms fall back to a plain LIKE.
+MIN_INDEXED_TERM = 3
+
+
+def fts_table_name(tablename):
+    return "{}_name_fts".format(tablename)
+
+
+def trgm_index_name(tablename):
+    return "ix_{}_name_trgm".format(tablename)
+
+
+def sqlite_ddl(tablename):
+    fts = fts_table_name(tablename)
+    return [
+        'CREATE VIRTUAL TABLE "{fts}" USING fts5('
+        'name, content="{t}", content_rowid="id", tokenize="trigram")',
+        'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{t}" BEGIN '
+        'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); END',
+        'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{t}" BEGIN '
+        'INSERT INTO "{fts}"("{fts}", rowid, name) '
+        "VALUES ('delete', old.id, old.name); END",
+        'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF name ON "{t}" BEGIN '
+        'INSERT INTO "{fts}"("{fts}", rowid, name) '
+        "VALUES ('delete', old.id, old.name); "
+        'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); END',
+        "INSERT INTO \"{fts}\"(\"{fts}\") VALUES ('rebuild')",
+    ], dict(fts=fts, t=tablename)
+
+
+def postgresql_ddl(tablename):
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        'CREATE INDEX IF NOT EXISTS "{ix}" ON "{t}" '
+        "USING gin (name gin_trgm_ops)",
+    ], dict(ix=trgm_index_name(tablename), t=tablename)
+
+
+def install(model):
+    # Attaches the search DDL to the model's table for `create_all()` and
+    # `drop_all()`. The Postgres index and the SQLite triggers go away with
+    # the table itself; the FTS5 table has to be dropped explicitly.
+    tablename = model.__tablename__
+    for dialect, build in (("sqlite", sqlite_ddl),
+                           ("postgresql", postgresql_ddl)):
+        statements, names = build(tablename)
+        for statement in statements:
+            event.listen(
+                model.__table__, "after_create",
+                DDL(statement.format(**names)).execute_if(dialect=dialect))
+    event.listen(
+        model.__table__, "before_drop",
+        DDL('DROP TABLE IF EXISTS "{}"'.format(fts_table_name(tablename)))
+        .execute_if(dialect="sqlite"))
+
+
+def _escape_like(term):
+    return (term.replace("\\", "\\\\")
+            .replace("%", "\\%").replace("_", "\\_"))
+
+
+def search_names(session, model, term):
+    # Returns (query, order_columns). The query yields (instance, rank) rows
+    # and order_columns sorts them best match first with the id as a
+    # tie-breaker, ready for keyset_page.
+    dialect = session.connection().dialect.name
+    escaped = _escape_like(term)
+    pattern = "%{}%".format(escaped)
+    if dialect == "postgresql":
+        # similarity() is a float4; widen it so the value stored in a page
+        # cursor compares equal to the one the database computes.
+        rank = (-cast(func.similarity(model.name, term), Float(53))).label(
+            "rank")
+        criterion = model.name.ilike(pattern, escape="\\")
+    else:
+        rank = case(
+            (func.lower(model.name) == term.lower(), 0),
+            (model.name.ilike(escaped + "%", escape="\\"), 1),
+            else_=2).label("rank")
+        if dialect == "sqlite" and len(term) >= MIN_INDEXED_TERM:
+            fts = table(fts_table_name(model.__tablename__),
+                        column("rowid"), column("name"))
+            phrase = '"{}"'.format(term.replace('"', '""'))
+            criterion = model.id.in_(
+                select(fts.c.rowid).where(fts.c.name.match(phrase)))
+        else:
+            criterion = model.name.ilike(pattern, escape="\\")
+    query = session.query(model, rank).filter(criterion)
+    return query, [rank, model.id]
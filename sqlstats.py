@@ -0,0 +1,122 @@
+import collections
+import json
+import re
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ----------------------------------------------------------------------------#
+# Per-request SQL statistics.
+# ----------------------------------------------------------------------------#
+# Cursor events on every engine (primary and replicas) count the statements
+# a request runs and the time spent in them. Statements are grouped by
+# shape, i.e. their SQL text with IN lists collapsed; a shape executed
+# SQL_REPEAT_THRESHOLD times or more in one request is almost always a lazy
+# load in a loop (N+1) and is logged as a warning. Each response gets a
+# Server-Timing header with the DB and total time. For streamed responses
+# the figures cover the work done before the first byte.
+
+PLACEHOLDER_LIST = re.compile(
+    r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+|\$\d+)"
+    r"(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+|\$\d+))*\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    return PLACEHOLDER_LIST.sub("(?)", WHITESPACE.sub(" ", statement)).strip()
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = collections.Counter()
+
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= threshold]
+
+
+class SQLStats(object):
+
+    def __init__(self, app=None, logger=None):
+        self.logger = logger
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config["SQL_INSTRUMENTATION"]:
+            return
+        self.threshold = app.config["SQL_REPEAT_THRESHOLD"]
+        self.logger = self.logger or app.logger
+        if not event.contains(
+                Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(
+                Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(
+                Engine, "after_cursor_execute", _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.sql_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.get("sql_stats")
+        if stats is None:
+            return response
+        elapsed = stats.elapsed()
+        response.headers.add(
+            "Server-Timing", 'db;dur={:.2f};desc="{} queries"'.format(
+                stats.db_time * 1000, stats.queries))
+        response.headers.add(
+            "Server-Timing", "total;dur={:.2f}".format(elapsed * 1000))
+        repeated = stats.repeated(self.threshold)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 3),
+            "db_ms": round(stats.db_time * 1000, 3),
+            "queries": stats.queries,
+        }
+        if repeated:
+            record["repeated"] = [
+                {"statement": shape, "count": count}
+                for shape, count in repeated]
+            self.logger.warning("sql %s", json.dumps(record))
+        else:
+            # The access log already carries the per-request DB time and
+            # query count.
+            self.logger.debug("sql %s", json.dumps(record))
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if context is not None:
+        context._sql_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    if context is None or not has_request_context():
+        return
+    stats = g.get("sql_stats")
+    start = getattr(context, "_sql_stats_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
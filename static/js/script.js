@@ -2,3 +2,29 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Fills an id field's <datalist> with {id, name} matches from an
+// autocomplete endpoint as the user types.
+window.attachTypeahead = function attachTypeahead(input, url) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending;
+  input.addEventListener('input', function () {
+    clearTimeout(pending);
+    if (/^\d*$/.test(input.value)) {
+      return;
+    }
+    pending = setTimeout(function () {
+      fetch(url + '?q=' + encodeURIComponent(input.value))
+        .then(function (response) { return response.json(); })
+        .then(function (body) {
+          list.innerHTML = '';
+          body.data.forEach(function (item) {
+            var option = document.createElement('option');
+            option.value = item.id;
+            option.label = item.name;
+            list.appendChild(option);
+          });
+        });
+    }, 100);
+  });
+};
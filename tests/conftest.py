@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///{}".format(tmp_path / "test.db"),
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "DATABASE_REPLICA_URIS": [],
+        "WTF_CSRF_ENABLED": False,
+        "PAGE_CACHE_SIZE": 0,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    # Every SQL statement sent while the test runs; clear() it before the
+    # part being measured.
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", record)
@@ -0,0 +1,14 @@
+from assets import minify_css
+
+
+def test_minify_css_squeezes_code():
+    css = "a , b {\n  color : red ;\n  /* note */\n}\n"
+    assert minify_css(css) == "a,b{color : red}"
+
+
+def test_minify_css_keeps_strings():
+    css = ('a::before { content: "x ; y /* z */" ; }\n'
+           "p { font-family: 'A , B' , serif; }")
+    assert minify_css(css) == (
+        'a::before{content: "x ; y /* z */"}'
+        "p{font-family: 'A , B',serif}")
@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+import importer
+from app import Artist, Show, Venue, db
+
+
+def seed():
+    venue = Venue(name="The Musical Hop")
+    artist = Artist(name="Guns N Petals")
+    show = Show(venue=venue, artist=artist, datetime=datetime.datetime.now())
+    db.session.add(show)
+    db.session.commit()
+    return venue.id, artist.id, show.id
+
+
+def test_allocate_ids_takes_the_sqlite_write_lock(app):
+    seed()
+    other = sa.create_engine(db.engine.url, connect_args={"timeout": 0})
+    with db.engine.begin() as first:
+        assert importer.allocate_ids(first, Show.__table__, 2) == [2, 3]
+        with pytest.raises(sa.exc.OperationalError):
+            with other.begin() as second:
+                importer.allocate_ids(second, Show.__table__, 2)
+    other.dispose()
+
+
+def test_schedule_conflict_is_a_409(client, monkeypatch):
+    venue_id, artist_id, show_id = seed()
+    # As if a concurrent batch had already taken the allocated id.
+    monkeypatch.setattr(
+        importer, "allocate_ids", lambda conn, table, count: [show_id])
+    response = client.post("/api/v1/shows/batch", json={"shows": [{
+        "venue_id": venue_id, "artist_id": artist_id,
+        "start_time": "2030-05-01 20:00:00"}]})
+    assert response.status_code == 409
+    assert response.get_json()["error"]
+    assert Show.query.count() == 1
@@ -0,0 +1,59 @@
+import base64
+import json
+
+import pytest
+
+from app import Artist, db
+
+CRAFTED = [
+    [None],
+    [[1]],
+    [{"id": 1}],
+    ["1"],
+    [True],
+    [1, 2],
+]
+
+
+def cursor(values):
+    raw = json.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("values", CRAFTED)
+def test_crafted_artist_cursor_is_rejected(client, values):
+    db.session.add(Artist(name="Guns N Petals"))
+    db.session.commit()
+    for path in ("/artists", "/api/v1/artists"):
+        response = client.get(path, query_string={"cursor": cursor(values)})
+        assert response.status_code == 400
+
+
+@pytest.mark.parametrize("values", [[None, 1], ["2030-01-01T20:00:00", None]])
+def test_null_show_cursor_is_rejected(client, values):
+    for path in ("/shows", "/api/v1/shows"):
+        response = client.get(path, query_string={"cursor": cursor(values)})
+        assert response.status_code == 400
+
+
+def test_null_venue_cursor_is_rejected(client):
+    response = client.get(
+        "/venues", query_string={"cursor": cursor([None, None, 1])})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("num_artists,heading", [
+    (3, b": 3</h3>"),
+    (6, b": more than 3</h3>"),
+])
+def test_search_count_beyond_threshold_is_a_lower_bound(
+        app, client, num_artists, heading):
+    # Without Postgres' planner estimate the count past the threshold is
+    # only known to exceed it.
+    app.config["COUNT_ESTIMATE_THRESHOLD"] = 3
+    db.session.add_all(
+        Artist(name="Band {}".format(i)) for i in range(num_artists))
+    db.session.commit()
+    response = client.post("/artists/search", data={"search_term": "band"})
+    assert response.status_code == 200
+    assert heading in response.data
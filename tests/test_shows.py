@@ -0,0 +1,41 @@
+import datetime
+
+from app import Artist, Show, ShowArchive, Venue, db
+
+
+def seed():
+    venue = Venue(name="The Musical Hop", city="San Francisco", state="CA")
+    artist = Artist(name="Guns N Petals")
+    now = datetime.datetime.now()
+    # The past show was last written before the upcoming one, so moving or
+    # deleting it leaves max(updated_at) alone.
+    shows = [Show(venue=venue, artist=artist,
+                  datetime=now + datetime.timedelta(days=days),
+                  updated_at=now + datetime.timedelta(seconds=days))
+             for days in (-30, 7)]
+    db.session.add_all(shows)
+    db.session.commit()
+    return shows
+
+
+def test_shows_etag_changes_when_a_show_is_deleted(client):
+    past, upcoming = seed()
+    etag = client.get("/shows").headers["ETag"]
+    db.session.delete(past)
+    db.session.commit()
+    response = client.get("/shows", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_shows_etag_changes_when_a_show_is_archived(client):
+    past, upcoming = seed()
+    etag = client.get("/shows").headers["ETag"]
+    db.session.add(ShowArchive(
+        id=past.id, datetime=past.datetime, venue_id=past.venue_id,
+        artist_id=past.artist_id, updated_at=past.updated_at))
+    db.session.delete(past)
+    db.session.commit()
+    response = client.get("/shows", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,85 @@
+import datetime
+import html
+import re
+
+import pytest
+
+from app import Artist, Show, Venue, db
+
+NEXT_LINK = re.compile(r'<a href="([^"]*cursor=[^"]*)"')
+CITIES = [("San Francisco", "CA"), ("New York", "NY"), ("Austin", "TX")]
+
+
+def seed(num_venues):
+    artist = Artist(name="Guns N Petals", city="San Francisco", state="CA")
+    db.session.add(artist)
+    now = datetime.datetime.now()
+    for i in range(num_venues):
+        city, state = CITIES[i % len(CITIES)]
+        venue = Venue(name="Venue {}".format(i), city=city, state=state)
+        db.session.add(venue)
+        for days in (-7, 7, 14):
+            db.session.add(Show(
+                venue=venue, artist=artist,
+                datetime=now + datetime.timedelta(days=days)))
+    db.session.commit()
+
+
+@pytest.mark.parametrize("num_venues", [3, 30])
+def test_venues_page_query_count(client, statements, num_venues):
+    # The areas -> venues -> num_upcoming_shows listing is one grouped
+    # query, plus the aggregate behind Last-Modified/ETag, however many
+    # venues and areas there are.
+    seed(num_venues)
+    statements.clear()
+    response = client.get("/venues")
+    assert response.status_code == 200
+    assert len(statements) == 2
+    assert response.data.count(b"Venue ") == num_venues
+
+
+def test_venues_page_counts_upcoming_shows(client):
+    seed(3)
+    areas, _ = Venue.find_areas(per_page=50)
+    # Areas come in (state, city) order.
+    assert [(area["city"], area["state"]) for area in areas] == CITIES
+    for area in areas:
+        for venue in area["venues"]:
+            assert venue["num_upcoming_shows"] == 2
+
+
+def test_venues_page_follows_next_past_missing_areas(client):
+    # Venues without a city or state still page through the Next links.
+    seed(3)
+    db.session.add_all([
+        Venue(name="Venue nowhere"),
+        Venue(name="Venue no city", state="CA"),
+        Venue(name="Venue no state", city="Austin"),
+    ])
+    db.session.commit()
+    seen, path = 0, "/venues?per_page=1"
+    while path:
+        response = client.get(path)
+        assert response.status_code == 200
+        seen += response.data.count(b"Venue ")
+        links = NEXT_LINK.findall(response.data.decode("utf-8"))
+        path = html.unescape(links[0]) if links else None
+    assert seen == 6
+
+
+def test_venue_details_load_genres_separately(app, statements):
+    # Genres and shows are both collections; joining them in one statement
+    # would return shows x genres rows.
+    seed(1)
+    venue = Venue.query.one()
+    venue.genres = ["Jazz", "Reggae", "Swing"]
+    db.session.commit()
+    venue_id = venue.id
+    db.session.expunge_all()
+    statements.clear()
+    data = Venue.find_details(venue_id)
+    assert sorted(data["genres"]) == ["Jazz", "Reggae", "Swing"]
+    assert data["upcoming_shows_count"] == 2
+    assert len(statements) == 3
+    assert not [statement for statement in statements
+                if "VenueGenre" in statement and '"Show"' in statement]
@@ -0,0 +1,195 @@
+import bisect
+import os
+import threading
+import unicodedata
+
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ----------------------------------------------------------------------------#
+# Typeahead.
+# ----------------------------------------------------------------------------#
+# An in-process prefix index over venue and artist names for the show form's
+# pickers. Each name is normalized (accents stripped, case folded,
+# whitespace collapsed) and stored once per word, so "pet" finds
+# "Guns N Petals"; lookups are a bisect into a sorted list and never touch
+# the database.
+#
+# The index is loaded when the app is built and updated by the create, edit
+# and delete handlers of the process that made the change. A background
+# thread picks up rows whose updated_at moved in other processes (other
+# workers, flask import) every TYPEAHEAD_REFRESH seconds (0 disables it), so
+# a lookup never waits on the database. Deletions made elsewhere are only
+# seen on the next full load.
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex(object):
+
+    def __init__(self):
+        self._keys = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _entries(self, id, name):
+        words = normalize(name).split()
+        return [(" ".join(words[i:]), id) for i in range(len(words))]
+
+    def add(self, id, name):
+        # Inserts or renames.
+        with self._lock:
+            self._remove(id)
+            self._names[id] = name
+            for entry in self._entries(id, name):
+                bisect.insort(self._keys, entry)
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        name = self._names.pop(id, None)
+        if name is None:
+            return
+        for entry in self._entries(id, name):
+            index = bisect.bisect_left(self._keys, entry)
+            if index < len(self._keys) and self._keys[index] == entry:
+                del self._keys[index]
+
+    def replace(self, rows):
+        # Builds a fresh index from (id, name) rows in one sort.
+        names = dict(rows)
+        keys = sorted(
+            entry for id, name in names.items()
+            for entry in self._entries(id, name))
+        with self._lock:
+            self._keys = keys
+            self._names = names
+
+    def search(self, prefix, limit=10):
+        # [(id, name)] whose name has a word starting with `prefix`, in
+        # key order, each id once.
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            names = self._names
+            index = bisect.bisect_left(keys, (prefix,))
+            while index < len(keys) and len(results) < limit:
+                key, id = keys[index]
+                if not key.startswith(prefix):
+                    break
+                if id not in seen:
+                    seen.add(id)
+                    results.append((id, names[id]))
+                index += 1
+        return results
+
+    def __len__(self):
+        return len(self._names)
+
+
+class Typeahead(object):
+
+    def __init__(self, app=None):
+        self.models = {}
+        self.indexes = {}
+        self._watermarks = {}
+        self.app = None
+        self.refresh_seconds = 0
+        self._stopped = threading.Event()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+        if app is not None:
+            self.init_app(app)
+
+    def register(self, kind, model):
+        # `model` needs id, name and updated_at columns.
+        self.models[kind] = model
+        self.indexes[kind] = PrefixIndex()
+
+    def init_app(self, app):
+        self.app = app
+        self.refresh_seconds = app.config["TYPEAHEAD_REFRESH"]
+        self.stop()
+        with app.app_context():
+            for kind in self.models:
+                self._catch_up(kind)
+        self._start()
+
+    def _start(self):
+        # Also runs in every forked child, since threads do not survive
+        # fork() and a preforked worker needs its own.
+        if self.app is None or self.refresh_seconds <= 0:
+            return
+        self._stopped = threading.Event()
+        threading.Thread(
+            target=self._run, args=(self._stopped,),
+            name="typeahead-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self, stopped):
+        while not stopped.wait(self.refresh_seconds):
+            with self.app.app_context():
+                for kind in self.models:
+                    self._catch_up(kind)
+
+    def _catch_up(self, kind):
+        # Loads `kind` on the first call and refreshes it afterwards.
+        # Errors are logged and retried on the next round (e.g. during
+        # `flask db upgrade` on an empty database there is no table yet),
+        # so they never end the refresh thread.
+        try:
+            if kind in self._watermarks:
+                self.refresh(kind)
+            else:
+                self.load(kind)
+        except Exception as error:
+            if isinstance(error, SQLAlchemyError):
+                self.models[kind].query.session.rollback()
+            self.app.logger.warning(
+                "typeahead: %s not refreshed: %s", kind,
+                error.__class__.__name__)
+
+    def load(self, kind):
+        model = self.models[kind]
+        rows = model.query.with_entities(
+            model.id, model.name, model.updated_at).all()
+        self.indexes[kind].replace((id, name) for id, name, _ in rows)
+        self._watermarks[kind] = max(
+            (updated for _, _, updated in rows if updated), default=None)
+
+    def refresh(self, kind):
+        # Picks up rows written by other processes since the last refresh.
+        model = self.models[kind]
+        watermark = self._watermarks.get(kind)
+        query = model.query.with_entities(
+            model.id, model.name, model.updated_at)
+        if watermark is not None:
+            query = query.filter(model.updated_at >= watermark)
+        for id, name, updated in query:
+            self.indexes[kind].add(id, name)
+            if updated and (watermark is None or updated > watermark):
+                watermark = updated
+        self._watermarks[kind] = watermark
+
+    def search(self, kind, prefix, limit=10):
+        # Answered from memory only; see _run for how the index is kept up
+        # to date.
+        return self.indexes[kind].search(prefix, limit)
+
+    def add(self, kind, id, name):
+        self.indexes[kind].add(id, name)
+
+    def remove(self, kind, id):
+        self.indexes[kind].remove(id)